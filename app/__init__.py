@@ -1,13 +1,15 @@
 import os
 import sys
 import logging
+import time
 import traceback
-from flask import Flask, request, jsonify, current_app
+from flask import Flask, request, jsonify, current_app, g
 from flask_cors import CORS
 from dotenv import load_dotenv
 
 from app.extensions import db, migrate, init_faiss
 from app.config.default import config
+from app.timing import server_timing_header
 
 def setup_logging():
     """Configura el logging para que sea visible en la consola"""
@@ -80,9 +82,25 @@ def create_app(config_name: str | None = None):
         "origins": allowed_origins,
         "allow_headers": ["Authorization", "Content-Type"],
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+        "expose_headers": ["Server-Timing"],
     }})
     app.logger.info(f"CORS configurado para: {allowed_origins}")
 
+    # ─────── Hooks de tiempos por etapa (Server-Timing) ───────
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def add_server_timing(resp):
+        header = server_timing_header()
+        if header:
+            total_ms = (time.perf_counter() - g.request_started) * 1000 if 'request_started' in g else None
+            if total_ms is not None:
+                header += f", total;dur={total_ms:.1f}"
+            resp.headers['Server-Timing'] = header
+        return resp
+
     # ─────── Hooks de log de respuestas y errores ───────
     @app.after_request
     def log_response(resp):
@@ -107,10 +125,12 @@ def create_app(config_name: str | None = None):
     with app.app_context():
         init_extensions(app)
         register_blueprints(app)
+        start_background_tasks(app)
         register_shell_context(app)
         db.create_all()
         from flask_migrate import stamp
         stamp()
+        init_search_indexes(app)
 
     return app
 
@@ -124,6 +144,23 @@ def init_extensions(app):
     app.logger.info("Extensiones inicializadas.")
 
 
+def init_search_indexes(app):
+    from app.services.LexicalIndexService import init_lexical_index
+    init_lexical_index(app)
+
+
+def start_background_tasks(app):
+    if app.config.get("TESTING"):
+        return
+    from app.services.TempUploadSweeper import init_temp_upload_sweeper
+    from app.services.SearchPersistenceWriter import init_search_persistence_writer
+    from app.services.SearchHistoryRetention import init_search_history_retention
+    init_temp_upload_sweeper(app)
+    init_search_persistence_writer(app)
+    init_search_history_retention(app)
+    app.logger.info("Tareas en segundo plano iniciadas.")
+
+
 def register_blueprints(app):
     from app.controllers.ControllersHome import bp as home_bp
     from app.controllers.ControllersUser import bp as user_bp
@@ -0,0 +1,75 @@
+"""
+Utilidades para ejecutar tareas de mantenimiento en segundo plano dentro del
+proceso de la aplicación Flask.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PeriodicTask:
+    """
+    Ejecuta una función cada `interval` segundos en un hilo daemon, dentro del
+    contexto de la aplicación. Los errores se registran y no detienen el ciclo.
+    """
+
+    def __init__(self, app, name: str, interval: float, func):
+        self.app = app
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        self.app.logger.info(f"[INFO] Tarea periódica '{self.name}' iniciada (intervalo: {self.interval}s).")
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            with self.app.app_context():
+                try:
+                    self.func()
+                except Exception as e:
+                    self.app.logger.error(f"[ERROR] Falló la tarea periódica '{self.name}'. Causa: {e}")
+
+
+_background_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='background-job')
+
+
+def run_in_background(app, name: str, func, *args, **kwargs):
+    """
+    Encola una tarea única para ejecutarse fuera de la petición, dentro del contexto
+    de la aplicación. Devuelve el Future; los errores se registran y no se propagan.
+    """
+    def _job():
+        with app.app_context():
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                app.logger.error(f"[ERROR] Falló la tarea en segundo plano '{name}'. Causa: {e}")
+
+    return _background_executor.submit(_job)
+
+
+_concurrent_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='request-job')
+
+
+def run_concurrently(app, func, *args, **kwargs):
+    """
+    Ejecuta una función en paralelo al hilo de la petición (por ejemplo, una llamada
+    de red independiente), dentro del contexto de la aplicación. Devuelve el Future;
+    a diferencia de run_in_background, los errores se propagan al llamar a result().
+    """
+    def _job():
+        with app.app_context():
+            return func(*args, **kwargs)
+
+    return _concurrent_executor.submit(_job)
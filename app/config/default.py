@@ -49,17 +49,84 @@ class Config:
     FAISS_INDEX_PATH = os.path.join(os.getcwd(), 'instance', 'main_faiss.index')
     FAISS_EMBEDDING_DIMENSION = 3072 # ¡Verifica que coincida con tu modelo de embedding!
 
+    # --- Configuración de búsqueda léxica ---
+    # 'memory': índice BM25 en memoria del proceso. 'postgres': tsvector + GIN en la base de datos.
+    LEXICAL_SEARCH_BACKEND = os.getenv('LEXICAL_SEARCH_BACKEND', 'memory')
+
+    # --- Caché de resultados de búsqueda ---
+    # Segundos que se reutiliza el resultado de una misma consulta (0 desactiva la caché).
+    # Las entradas se invalidan solas cuando cambia la versión del índice.
+    SEARCH_CACHE_TTL_SECONDS = int(os.getenv('SEARCH_CACHE_TTL_SECONDS', 10 * 60))
+    SEARCH_BATCH_MAX_QUERIES = int(os.getenv('SEARCH_BATCH_MAX_QUERIES', 50))  # Tope de consultas por petición a /api/search/batch
+    SEARCH_SHORTLIST_MAX_DOCUMENTS = int(os.getenv('SEARCH_SHORTLIST_MAX_DOCUMENTS', 500))  # Tope de candidatos por petición a /api/search/rerank
+    # Caché semántica: reutiliza la respuesta de una consulta reciente con redacción distinta
+    # pero embedding casi igual (similitud coseno >= umbral). Cuesta un embedding extra por consulta nueva.
+    SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'false').lower() == 'true'
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', 0.95))
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', 256))
+
+    # --- Historial de búsquedas ---
+    # Con SEARCH_PERSISTENCE_ASYNC el archivo de resultados y el registro de historial se escriben
+    # en segundo plano, en lotes, fuera del tiempo de respuesta de /api/search.
+    SEARCH_PERSISTENCE_ASYNC = os.getenv('SEARCH_PERSISTENCE_ASYNC', 'true').lower() == 'true'
+    SEARCH_PERSISTENCE_BATCH_SIZE = int(os.getenv('SEARCH_PERSISTENCE_BATCH_SIZE', 50))
+    SEARCH_PERSISTENCE_FLUSH_INTERVAL_SECONDS = float(os.getenv('SEARCH_PERSISTENCE_FLUSH_INTERVAL_SECONDS', 1.0))
+    SEARCH_PERSISTENCE_QUEUE_SIZE = int(os.getenv('SEARCH_PERSISTENCE_QUEUE_SIZE', 1000))
+    # 'ids': una fila por candidato (document_id, posición, score); el detalle se hidrata al abrirlo.
+    # 'full': copia completa de los perfiles en result_json (comportamiento anterior).
+    SEARCH_HISTORY_STORE_MODE = os.getenv('SEARCH_HISTORY_STORE_MODE', 'ids')
+    # En modo 'ids', guarda además una copia comprimida (zlib) de los perfiles tal como se mostraron.
+    SEARCH_HISTORY_SNAPSHOTS = os.getenv('SEARCH_HISTORY_SNAPSHOTS', 'false').lower() == 'true'
+    RESULTADOS_FOLDER = os.getenv('RESULTADOS_FOLDER', 'resultados')
+    SEARCH_HISTORY_RETENTION_DAYS = int(os.getenv('SEARCH_HISTORY_RETENTION_DAYS', 90))  # Se eliminan las entradas sin ejecutar en este plazo
+    SEARCH_HISTORY_COMPACT_AFTER_DAYS = int(os.getenv('SEARCH_HISTORY_COMPACT_AFTER_DAYS', 7))  # Se comprimen sus archivos y resultados
+    SEARCH_HISTORY_RETENTION_BATCH_SIZE = int(os.getenv('SEARCH_HISTORY_RETENTION_BATCH_SIZE', 500))
+    SEARCH_HISTORY_RETENTION_INTERVAL_SECONDS = int(os.getenv('SEARCH_HISTORY_RETENTION_INTERVAL_SECONDS', 60 * 60))
+
     # --- Configuración de OpenAI ---
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
     OPENAI_EMBEDDING_MODEL = os.getenv('OPENAI_EMBEDDING_MODEL', 'text-embedding-3-large')
     OPENAI_COMPLETION_MODEL = os.getenv('OPENAI_COMPLETION_MODEL', 'gpt-4o')
     
+    # --- Configuración de almacenamiento de archivos ---
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 's3')  # 's3' o 'local'
+    LOCAL_STORAGE_ROOT = os.getenv('LOCAL_STORAGE_ROOT', os.path.join(os.getcwd(), 'instance', 'storage'))
+
+    # --- Configuración de S3 ---
+    S3_UPLOAD_MAX_CONCURRENCY = int(os.getenv('S3_UPLOAD_MAX_CONCURRENCY', 4))  # Partes subidas en paralelo
+    S3_MULTIPART_THRESHOLD = int(os.getenv('S3_MULTIPART_THRESHOLD', 8 * 1024 * 1024))  # Desde este tamaño se usa multipart
+    S3_MULTIPART_CHUNKSIZE = int(os.getenv('S3_MULTIPART_CHUNKSIZE', 8 * 1024 * 1024))
+    S3_DELETE_MAX_CONCURRENCY = int(os.getenv('S3_DELETE_MAX_CONCURRENCY', 4))  # Lotes de delete_objects en paralelo
+    PRESIGNED_URL_EXPIRATION = int(os.getenv('PRESIGNED_URL_EXPIRATION', 15 * 60))  # Segundos de validez de las URLs de descarga
+
     # --- Configuración de la Aplicación ---
     MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # Limita el tamaño de subida a 50MB
     UPLOAD_FOLDER = os.path.join(os.getcwd(), 'uploads')
     ALLOWED_EXTENSIONS = {'pdf'}
     MIN_TEXT_LENGTH = 100  # Mínimo número de caracteres para considerar válido un texto
 
+    # --- Limpieza de subidas temporales ---
+    TEMP_UPLOAD_TTL_SECONDS = int(os.getenv('TEMP_UPLOAD_TTL_SECONDS', 60 * 60))  # Vida máxima de un archivo en Uploads/
+    TEMP_UPLOAD_MAX_BYTES = int(os.getenv('TEMP_UPLOAD_MAX_BYTES', 500 * 1024 * 1024))  # Tope total del directorio
+    TEMP_UPLOAD_MIN_AGE_SECONDS = int(os.getenv('TEMP_UPLOAD_MIN_AGE_SECONDS', 5 * 60))  # Nunca se desalojan archivos más nuevos
+    TEMP_UPLOAD_SWEEP_INTERVAL_SECONDS = int(os.getenv('TEMP_UPLOAD_SWEEP_INTERVAL_SECONDS', 5 * 60))
+
+    # --- Pool de procesos para trabajo CPU-bound sobre PDFs ---
+    # 0 = en línea (sin pool). Con N > 0, PyPDF2, el rasterizado y la compresión corren en N procesos.
+    PDF_PROCESS_POOL_WORKERS = int(os.getenv('PDF_PROCESS_POOL_WORKERS', 0))
+    PDF_PROCESS_POOL_TIMEOUT = float(os.getenv('PDF_PROCESS_POOL_TIMEOUT', 120))
+
+    # --- Configuración de Vision/OCR ---
+    # Si está activo, /process-pdfs pasa a Vision automáticamente en vez de responder 'needs_vision'.
+    # El cliente puede sobrescribirlo por solicitud con el campo de formulario 'auto_vision'.
+    AUTO_VISION_FALLBACK = os.getenv('AUTO_VISION_FALLBACK', 'false').lower() == 'true'
+    VISION_MAX_PAGES = int(os.getenv('VISION_MAX_PAGES', 3))  # Máximo de páginas enviadas a Vision por documento
+    VISION_PAGE_MIN_CHARS = int(os.getenv('VISION_PAGE_MIN_CHARS', 50))  # Debajo de esto la página se considera sin capa de texto
+    VISION_MAX_WORKERS = int(os.getenv('VISION_MAX_WORKERS', 3))  # Llamadas concurrentes a la API de Vision por documento
+    VISION_PAGE_TIMEOUT = float(os.getenv('VISION_PAGE_TIMEOUT', 60))  # Segundos máximos por página
+    VISION_IMAGE_FORMAT = os.getenv('VISION_IMAGE_FORMAT', 'JPEG')  # JPEG o WEBP
+    VISION_MAX_IMAGE_BYTES = int(os.getenv('VISION_MAX_IMAGE_BYTES', 512 * 1024))  # Presupuesto por página enviada
+
 
 class DevelopmentConfig(Config):
     """Configuración para el entorno de desarrollo."""
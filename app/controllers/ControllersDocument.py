@@ -1,8 +1,11 @@
-from flask import Blueprint, jsonify, request, current_app, send_from_directory
+from flask import Blueprint, Response, jsonify, request, current_app, send_from_directory
 from werkzeug.utils import secure_filename
 from app.services.DocumentService import DocumentService
+from app.services.TempUploadSweeper import get_temp_upload_sweeper
+from app.services.StorageService import create_storage_backend, LocalStorageBackend
 from app.middleware import require_auth
 import os
+import mimetypes
 import traceback
 
 
@@ -21,10 +24,12 @@ def process_pdfs():
     
     user_id_form = request.form.get("user_id")
     ai_plus_enabled = request.form.get("ai_enabled", "false").lower() == "true"
+    auto_vision_default = "true" if current_app.config.get("AUTO_VISION_FALLBACK", False) else "false"
+    auto_vision = request.form.get("auto_vision", auto_vision_default).lower() == "true"
     
     # Logs con print Y logger para asegurar visibilidad
-    print(f"📋 DATOS RECIBIDOS - user_id: {user_id_form}, ai_plus: {ai_plus_enabled}", flush=True)
-    current_app.logger.critical(f"📋 DATOS RECIBIDOS - user_id: {user_id_form}, ai_plus: {ai_plus_enabled}")
+    print(f"📋 DATOS RECIBIDOS - user_id: {user_id_form}, ai_plus: {ai_plus_enabled}, auto_vision: {auto_vision}", flush=True)
+    current_app.logger.critical(f"📋 DATOS RECIBIDOS - user_id: {user_id_form}, ai_plus: {ai_plus_enabled}, auto_vision: {auto_vision}")
     
     current_app.logger.info(f"[INFO] Inicio de procesamiento de archivos. Endpoint: POST /process-pdfs. User ID: {user_id_form}.")
     current_app.logger.info(f"[INFO] Inicio. user_id={user_id_form}, ai_plus={ai_plus_enabled}")
@@ -80,7 +85,8 @@ def process_pdfs():
                 print(f"🤖 Llamando a DocumentService.process_pdf()", flush=True)
                 res = doc_service.process_pdf(
                     path, user_id, filename,
-                    use_vision=False, ai_plus_enabled=ai_plus_enabled
+                    use_vision=False, ai_plus_enabled=ai_plus_enabled,
+                    auto_vision=auto_vision
                 )
 
                 if res.get("success"):
@@ -201,6 +207,16 @@ def skip_vision_processing():
         return jsonify({'error': 'Error interno del servidor', 'details': str(e)}), 500
 
 
+@bp.route('/temp-uploads/stats', methods=['GET'])
+@require_auth
+def temp_uploads_stats():
+    """Devuelve los contadores del barredor de subidas temporales."""
+    sweeper = get_temp_upload_sweeper()
+    if sweeper is None:
+        return jsonify({'error': 'El barredor de subidas temporales no está activo'}), 503
+    return jsonify(sweeper.get_stats()), 200
+
+
 @bp.route('/<int:document_id>', methods=['GET'])
 @require_auth
 def get_document(document_id):
@@ -292,6 +308,8 @@ def delete_file():
 def delete_all():
     """
     Elimina todos los documentos del usuario, sus archivos en S3 e índices FAISS.
+    Los archivos se borran en segundo plano después de responder: la respuesta informa cuántos
+    quedan pendientes (pending_file_deletions) y los fallos solo se registran en el log.
     Requiere confirmación explícita del usuario.
     """
     request_data = request.get_json() or {}
@@ -330,7 +348,7 @@ def delete_all():
             'success': result['success'], 
             'message': result['message'],
             'deleted_count': result.get('deleted_count', 0),
-            'failed_s3_deletions': result.get('failed_s3_deletions', 0)
+            'pending_file_deletions': result.get('pending_file_deletions', 0)
         }), result['status']
     
     except Exception as e:
@@ -362,26 +380,60 @@ def list_documents():
 @bp.route('/get-pdf', methods=['GET'])
 @require_auth
 def get_pdf():
-    user_id = request.args.get('user_id', type=int)
+    # El dueño siempre es el usuario del token; user_id en la query se acepta por compatibilidad
+    user_id = request.user['user_id']
+    query_user_id = request.args.get('user_id', type=int)
+    document_id = request.args.get('document_id', type=int)
     filename = request.args.get('filename', type=str)
-    current_app.logger.info(f"[INFO] Solicitud de URL de PDF. Endpoint: GET /get-pdf. User ID: {user_id}, Archivo: {filename}.")
+    current_app.logger.info(f"[INFO] Solicitud de URL de PDF. Endpoint: GET /get-pdf. User ID: {user_id}, Documento: {document_id}, Archivo: {filename}.")
     
     try:
-        if not user_id or not filename:
-            return jsonify({'error': 'Faltan parámetros user_id o filename'}), 400
+        if query_user_id is not None and query_user_id != user_id:
+            current_app.logger.error(f"[ERROR] Conflicto de autorización en GET /get-pdf. ID de token: {user_id}, ID de la query: {query_user_id}.")
+            return jsonify({'error': 'No autorizado: el user_id no coincide con el del token'}), 403
+        if not (document_id or filename):
+            return jsonify({'error': 'Falta el parámetro document_id (o filename)'}), 400
         doc_service = DocumentService(os.getenv('AWS_BUCKET'))
-        result = doc_service.get_pdf_url(user_id, filename)
+        result = doc_service.get_pdf_url(user_id, filename=filename, document_id=document_id)
 
         if not result['success']:
             return jsonify({'error': 'Documento no encontrado'}), 404
 
-        return jsonify({'success': True, 'file_url': result['file_url']})
+        return jsonify({'success': True, 'file_url': result['file_url'], 'expires_in': result['expires_in']})
     
     except Exception as e:
         current_app.logger.error(f"[ERROR] No se pudo obtener la URL del PDF. Endpoint: GET /get-pdf. Causa: {str(e)}")
         return jsonify({'error': 'Error interno del servidor'}), 500
 
 
+@bp.route('/files/<token>', methods=['GET'])
+def download_local_file(token):
+    """
+    Descarga un archivo del almacenamiento local. El token firmado y con expiración
+    cumple el rol de una URL prefirmada, por eso el endpoint no requiere autenticación.
+    """
+    storage = create_storage_backend()
+    if not isinstance(storage, LocalStorageBackend):
+        return jsonify({'error': 'Recurso no encontrado'}), 404
+
+    key = storage.resolve_token(token)
+    if not key:
+        return jsonify({'error': 'El enlace es inválido o ha expirado'}), 403
+
+    try:
+        stream = storage.stream(key)
+        first_chunk = next(stream, b'')
+    except (FileNotFoundError, ValueError):
+        return jsonify({'error': 'Archivo no encontrado'}), 404
+
+    def generate():
+        yield first_chunk
+        yield from stream
+
+    mimetype = mimetypes.guess_type(key)[0] or 'application/octet-stream'
+    return Response(generate(), mimetype=mimetype, headers={'Content-Disposition': 'inline'})
+
+
 @bp.route('/upload-form', methods=['GET'])
 def upload_form():
     """Sirve un formulario HTML simple para pruebas de carga de archivos."""
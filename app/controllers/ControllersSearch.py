@@ -1,8 +1,15 @@
 from app.services.SearchService import SearchService
 from app.services.HybridSearchService import HybridSearchService  # NUEVA IMPORTACIÓN
 from app.services.SearchHistoryService import SearchHistoryService
+from app.services.SearchCacheService import get_search_cache_stats
+from app.services.SemanticQueryCache import get_semantic_query_cache
+from app.services.SearchPersistenceWriter import get_search_persistence_writer
+from app.services.SearchHistoryRetention import get_search_history_retention
+from app.middleware import require_auth
+from app.timing import get_latency_stats
 import json
-from flask import Blueprint, request, jsonify, current_app
+import math
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 bp = Blueprint('search', __name__)
 
 # Modificar el endpoint de búsqueda
@@ -34,16 +41,156 @@ def search():
         current_app.logger.error(f"Error en la ruta de búsqueda: {e}")
         return jsonify({'error': 'Error interno del servidor', 'details': str(e)}), 500
 
+@bp.route('/batch', methods=['POST'], strict_slashes=False)
+def search_batch():
+    """
+    Búsqueda semántica de varias consultas en una sola petición.
+    Body: {"queries": ["consulta 1", "consulta 2", ...], "k": 10}.
+    Devuelve {"searches": [{"query", "results", "search_result_id"}, ...]} en el mismo orden.
+    """
+    try:
+        data = request.get_json() or {}
+        queries = data.get('queries')
+        k = data.get('k', 10)
+        max_queries = current_app.config.get('SEARCH_BATCH_MAX_QUERIES', 50)
+
+        if not isinstance(queries, list) or not queries or not all(isinstance(query, str) and query.strip() for query in queries):
+            return jsonify({'error': 'Se requiere una lista no vacía de consultas en el campo "queries"'}), 400
+        if len(queries) > max_queries:
+            return jsonify({'error': f'Se permiten como máximo {max_queries} consultas por petición'}), 400
+        if not isinstance(k, int) or not 1 <= k <= 100:
+            return jsonify({'error': 'El campo "k" debe ser un entero entre 1 y 100'}), 400
+
+        result_data = SearchService().perform_batch_search([query.strip() for query in queries], k)
+        return jsonify(result_data), 200
+
+    except Exception as e:
+        current_app.logger.error(f"Error en la búsqueda por lotes: {e}")
+        return jsonify({'error': 'Error interno del servidor', 'details': str(e)}), 500
+
+@bp.route('/similar/<int:document_id>', methods=['GET'], strict_slashes=False)
+def search_similar(document_id):
+    """
+    Candidatos más parecidos a un candidato existente ("más como este"), usando su vector
+    guardado. Parámetro opcional: ?k=N (1-100, por defecto 10).
+    """
+    try:
+        k = request.args.get('k', 10, type=int)
+        if not 1 <= k <= 100:
+            return jsonify({'error': 'El parámetro "k" debe ser un entero entre 1 y 100'}), 400
+        result_data = SearchService().find_similar_candidates(document_id, k)
+        return jsonify(result_data), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        current_app.logger.error(f"Error en la búsqueda de candidatos similares a {document_id}: {e}")
+        return jsonify({'error': 'Error interno del servidor', 'details': str(e)}), 500
+
+@bp.route('/rerank', methods=['POST'], strict_slashes=False)
+def rerank_shortlist():
+    """
+    Ordena una lista de candidatos contra una consulta con el scoring híbrido.
+    Body: {"query": "descripción del puesto", "document_ids": [12, 45, ...]}.
+    Los IDs sin candidato se devuelven en "not_found".
+    """
+    try:
+        data = request.get_json() or {}
+        query = data.get('query')
+        document_ids = data.get('document_ids')
+        max_documents = current_app.config.get('SEARCH_SHORTLIST_MAX_DOCUMENTS', 500)
+
+        if not query:
+            return jsonify({'error': 'Se requiere un texto de consulta en el campo "query"'}), 400
+        if not isinstance(document_ids, list) or not document_ids or not all(isinstance(document_id, int) for document_id in document_ids):
+            return jsonify({'error': 'Se requiere una lista no vacía de IDs enteros en el campo "document_ids"'}), 400
+        if len(document_ids) > max_documents:
+            return jsonify({'error': f'Se permiten como máximo {max_documents} candidatos por petición'}), 400
+
+        result_data = HybridSearchService().rerank_shortlist(query, document_ids)
+        return jsonify(result_data), 200
+
+    except Exception as e:
+        current_app.logger.error(f"Error al re-rankear la lista de candidatos: {e}")
+        return jsonify({'error': 'Error interno del servidor', 'details': str(e)}), 500
+
+@bp.route('/stream', methods=['POST'], strict_slashes=False)
+def search_stream():
+    """
+    Variante en streaming de la búsqueda. Emite cada etapa apenas termina:
+    'semantic' (resultados de FAISS), 'keywords' y 'final' (resultados re-rankeados
+    y search_result_id). Con "hybrid": false solo se emite 'final'.
+    Responde NDJSON (una línea JSON por evento, {"event": ..., "data": ...}) o
+    Server-Sent Events si el cliente envía Accept: text/event-stream.
+    """
+    data = request.get_json() or {}
+    query = data.get('query')
+    use_hybrid = data.get('hybrid', True)
+
+    if not query:
+        return jsonify({'error': 'Se requiere un texto de consulta en el campo "query"'}), 400
+
+    use_sse = request.accept_mimetypes.best_match(['application/x-ndjson', 'text/event-stream']) == 'text/event-stream'
+
+    def format_event(event, payload):
+        if use_sse:
+            return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+        return json.dumps({'event': event, 'data': payload}, ensure_ascii=False) + "\n"
+
+    def generate():
+        try:
+            if use_hybrid:
+                events = HybridSearchService().iter_hybrid_search(query)
+            else:
+                events = [('final', SearchService().perform_search(query))]
+            for event, payload in events:
+                yield format_event(event, payload)
+        except Exception as e:
+            current_app.logger.error(f"Error en la búsqueda en streaming: {e}")
+            yield format_event('error', {'error': 'Error interno del servidor', 'details': str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream' if use_sse else 'application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@bp.route('/metrics', methods=['GET'], strict_slashes=False)
+@require_auth
+def search_metrics():
+    """
+    Histogramas de latencia por etapa (llm_expand, embedding, faiss, candidates, lexical,
+    fusion, rerank, history, ...) y contadores de las cachés, del escritor de historial
+    y de la retención.
+    """
+    semantic_cache = get_semantic_query_cache()
+    writer = get_search_persistence_writer()
+    retention = get_search_history_retention()
+    return jsonify({
+        'latency': get_latency_stats(),
+        'search_cache': get_search_cache_stats(),
+        'semantic_cache': semantic_cache.stats() if semantic_cache is not None else None,
+        'persistence_writer': writer.get_stats() if writer is not None else None,
+        'history_retention': retention.get_stats() if retention is not None else None,
+    }), 200
+
 @bp.route('/history', methods=['GET'], strict_slashes=False)
 def get_search_history():
     """
-    Obtiene el historial completo de búsquedas.
+    Obtiene el historial de búsquedas paginado por cursor, del más reciente al más antiguo.
+    Parámetros: ?limit=N (1-100, por defecto 20), ?cursor=<next_cursor de la página anterior>
+    y ?q=texto para filtrar por las consultas que contienen esas palabras.
+    Cada elemento no incluye los resultados; se obtienen con GET /history/<id>.
     """
     try:
         history_service = SearchHistoryService()
-        history = history_service.get_all_search_results()
-        history_data = [res.to_dict() for res in history]
-        return jsonify(history_data), 200
+        page = history_service.get_search_history_page(
+            limit=request.args.get('limit', 20, type=int),
+            cursor=request.args.get('cursor') or None,
+            query_text=request.args.get('q', '').strip() or None
+        )
+        return jsonify(page), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         current_app.logger.error(f"Error al obtener historial: {e}")
         return jsonify({'error': 'Error al obtener el historial'}), 500
@@ -52,12 +199,23 @@ def get_search_history():
 def get_search_result_by_id(search_id):
     """
     Obtiene un resultado de búsqueda específico por su ID.
+    El historial se guarda en segundo plano: si el ID es de una búsqueda que todavía está en
+    la cola de escritura, responde 202 con Retry-After en lugar de 404. En el caso raro de que
+    otro proceso haya guardado la misma consulta a la vez, el ID reservado se agrupa en esa
+    entrada y, una vez guardado, responde 404 (la entrada está en GET /history).
     """
+    history_service = SearchHistoryService()
     try:
-        history_service = SearchHistoryService()
-        result = history_service.get_search_result_by_id(search_id)
-        return jsonify(result.to_dict()), 200
+        result = history_service.get_search_result_detail(search_id)
+        return jsonify(result), 200
     except ValueError as e:
+        if history_service.is_search_pending(search_id):
+            retry_after = max(1, math.ceil(get_search_persistence_writer().flush_interval))
+            return jsonify({
+                'id': search_id,
+                'status': 'pending',
+                'message': 'La búsqueda todavía se está guardando en el historial. Reintente en unos instantes.'
+            }), 202, {'Retry-After': str(retry_after)}
         return jsonify({'error': str(e)}), 404
     except Exception as e:
         return jsonify({'error': 'Error interno al obtener resultado'}), 500
@@ -6,7 +6,9 @@ utilizados en toda la aplicación.
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 import faiss
+import numpy as np
 import os
+import threading
 from flask import current_app
 
 
@@ -20,10 +22,15 @@ migrate = Migrate()
 faiss_index = None
 _faiss_index_path = None # Para guardar la ruta
 
+# Versión del corpus indexado: cambia cada vez que se agregan, editan o eliminan candidatos
+_index_version = 0
+_index_version_lock = threading.Lock()
+
 def init_faiss(app):
     """
     Inicializa o carga un índice FAISS.
-    Usa IndexIDMap para asociar IDs de documentos directamente.
+    Usa IndexIDMap2 para asociar IDs de documentos directamente y poder recuperar
+    vectores por ID sin recorrer el mapa completo.
     """
     global faiss_index, _faiss_index_path
 
@@ -41,6 +48,9 @@ def init_faiss(app):
             current_app.logger.info(f"Cargando índice FAISS desde {_faiss_index_path}")
             faiss_index = faiss.read_index(_faiss_index_path)
             current_app.logger.info(f"Índice FAISS cargado. Número actual de vectores: {faiss_index.ntotal}")
+            if not isinstance(faiss_index, faiss.IndexIDMap2):
+                faiss_index = _convert_to_id_map2(faiss_index)
+                save_faiss_index()
         except Exception as e:
             current_app.logger.error(f"Error al cargar el índice FAISS desde {_faiss_index_path}: {e}. Se creará uno nuevo.")
             faiss_index = None # Asegurar que se cree uno nuevo
@@ -49,14 +59,26 @@ def init_faiss(app):
         current_app.logger.info(f"Creando nuevo índice FAISS en {_faiss_index_path} con dimensión {embedding_dimension}")
         # Usamos IndexFlatL2 como el índice base
         index_flat = faiss.IndexFlatL2(embedding_dimension)
-        # Envolvemos con IndexIDMap para usar nuestros propios IDs (Document.id)
-        faiss_index = faiss.IndexIDMap(index_flat)
+        # Envolvemos con IndexIDMap2 para usar nuestros propios IDs (Document.id)
+        faiss_index = faiss.IndexIDMap2(index_flat)
         current_app.logger.info("Nuevo índice FAISS creado.")
         # Guardar el índice vacío inmediatamente
         save_faiss_index()
 
     return faiss_index
 
+def _convert_to_id_map2(index):
+    """
+    Migra un índice IndexIDMap guardado con versiones anteriores a IndexIDMap2, que mantiene
+    el mapa inverso ID -> posición y permite reconstruct por ID en O(1).
+    """
+    base_index = faiss.downcast_index(index.index)
+    converted = faiss.IndexIDMap2(faiss.IndexFlatL2(index.d))
+    if index.ntotal:
+        converted.add_with_ids(base_index.reconstruct_n(0, index.ntotal), faiss.vector_to_array(index.id_map))
+    current_app.logger.info(f"Índice FAISS migrado a IndexIDMap2 ({converted.ntotal} vectores).")
+    return converted
+
 def get_faiss_index():
     """Obtiene el índice FAISS inicializado."""
     global faiss_index
@@ -78,3 +100,42 @@ def save_faiss_index():
             current_app.logger.error(f"Error al guardar el índice FAISS en {_faiss_index_path}: {e}")
     else:
         current_app.logger.warning("Intento de guardar índice FAISS, pero no está inicializado o la ruta no está configurada.")
+
+
+def reconstruct_vectors(document_ids: list[int]) -> dict:
+    """
+    Recupera del índice FAISS los vectores almacenados para los IDs de documento dados.
+    Devuelve {document_id: np.ndarray}; los IDs que no están en el índice se omiten.
+    """
+    if faiss_index is None or not document_ids:
+        return {}
+
+    # IndexIDMap2 resuelve cada ID con su mapa inverso: el costo depende solo de los IDs pedidos
+    document_ids = list(dict.fromkeys(int(document_id) for document_id in document_ids))
+    try:
+        return dict(zip(document_ids, faiss_index.reconstruct_batch(np.array(document_ids, dtype=np.int64))))
+    except RuntimeError:
+        # Algún ID no está en el índice: se recuperan de a uno, omitiendo los que faltan
+        vectors = {}
+        for document_id in document_ids:
+            try:
+                vectors[document_id] = faiss_index.reconstruct(document_id)
+            except RuntimeError:
+                continue
+        return vectors
+
+
+def get_index_version() -> int:
+    """Versión actual del corpus indexado (FAISS + perfiles)."""
+    return _index_version
+
+
+def bump_index_version() -> int:
+    """
+    Incrementa la versión del corpus. Las cachés de búsqueda incluyen la versión en su
+    clave, por lo que las entradas anteriores dejan de usarse.
+    """
+    global _index_version
+    with _index_version_lock:
+        _index_version += 1
+        return _index_version
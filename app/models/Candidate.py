@@ -2,9 +2,14 @@
 
 from app.extensions import db
 from datetime import datetime
+from sqlalchemy import Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
 
 class Candidate(db.Model):
     __tablename__ = 'candidates'
+    __table_args__ = (
+        db.Index('ix_candidates_search_vector', 'search_vector', postgresql_using='gin'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     # Relación uno a uno con el documento original
@@ -33,6 +38,18 @@ class Candidate(db.Model):
     # Almacenamos la lista de diccionarios de educación como un JSON array
     educacion = db.Column(db.JSON)
 
+    # --- CAMPOS DE BÚSQUEDA (precalculados al crear o editar el perfil) ---
+    # Texto normalizado (minúsculas, sin tildes) con los tokens separados por un espacio
+    search_text = db.Column(db.Text)
+    # Tokens únicos del texto normalizado, para consultas de keywords por conjunto
+    search_tokens = db.Column(db.JSON)
+    # tsvector generado por PostgreSQL a partir de search_text (español + inglés), con índice GIN
+    search_vector = db.deferred(db.Column(TSVECTOR, Computed(
+        "to_tsvector('spanish'::regconfig, coalesce(search_text, '')) || "
+        "to_tsvector('english'::regconfig, coalesce(search_text, ''))",
+        persisted=True
+    )))
+
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
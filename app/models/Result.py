@@ -1,5 +1,9 @@
+import json
+import zlib
 from datetime import datetime
 from app.extensions import db
+from sqlalchemy import Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
 
 class SearchResult(db.Model):
     """
@@ -7,18 +11,47 @@ class SearchResult(db.Model):
 
     Atributos:
         id: ID único del resultado
-        query: Texto de búsqueda utilizado
-        result_json: Lista de resultados en formato JSON (document_id, filename, similarity_percentage, profile)
-        saved_file: Nombre del archivo JSON donde se guardaron los resultados
-        created_at: Fecha y hora de creación
+        query: Texto de búsqueda utilizado (la redacción de la última ejecución)
+        query_normalized: Consulta normalizada; las búsquedas repetidas se agrupan en una sola entrada
+        search_type: Modo de búsqueda ('hybrid' o 'semantic')
+        hit_count: Cantidad de veces que se ejecutó la consulta
+        last_run_at: Fecha y hora de la última ejecución
+        result_json: Lista de resultados en formato JSON (document_id, filename, similarity_percentage, profile).
+                     Solo se completa con SEARCH_HISTORY_STORE_MODE='full'; si no, los resultados están en `items`.
+        snapshot: Copia opcional de los resultados completos, en JSON comprimido con zlib
+        saved_file: Nombre del archivo JSON (o .json.gz, si ya se compactó) con los resultados
+        created_at: Fecha y hora de la primera ejecución
+        search_vector: tsvector de la consulta para la búsqueda en el historial
     """
     __tablename__ = 'search_results'
+    __table_args__ = (
+        db.Index('ix_search_results_search_vector', 'search_vector', postgresql_using='gin'),
+        # Soporta la paginación por cursor del historial (ORDER BY last_run_at DESC, id DESC)
+        db.Index('ix_search_results_last_run_at_id', db.desc('last_run_at'), db.desc('id')),
+        # Una sola entrada por consulta normalizada y modo: las repeticiones se agrupan en ella
+        db.Index('ix_search_results_query_normalized_type', 'query_normalized', 'search_type', unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     query = db.Column(db.Text, nullable=False)
-    result_json = db.Column(db.JSON, nullable=False)
+    query_normalized = db.Column(db.Text, nullable=True)
+    search_type = db.Column(db.String(20), nullable=True)
+    hit_count = db.Column(db.Integer, nullable=False, default=1)
+    last_run_at = db.Column(db.DateTime, default=datetime.utcnow)
+    result_json = db.Column(db.JSON, nullable=True)
+    snapshot = db.deferred(db.Column(db.LargeBinary, nullable=True))
     saved_file = db.Column(db.String(255), nullable=True)  # ejemplo: resultados_2025-06-09_12-30-00.json
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # tsvector generado por PostgreSQL a partir de la consulta (español + inglés), con índice GIN
+    search_vector = db.deferred(db.Column(TSVECTOR, Computed(
+        "to_tsvector('spanish'::regconfig, coalesce(query, '')) || "
+        "to_tsvector('english'::regconfig, coalesce(query, ''))",
+        persisted=True
+    )))
+
+    # Relaciones
+    items = db.relationship('SearchResultItem', back_populates='search_result', order_by='SearchResultItem.rank',
+                            cascade='all, delete-orphan', passive_deletes=True)
 
     def __repr__(self):
         return f'<SearchResult id={self.id} query="{self.query[:30]}...">'
@@ -29,5 +62,18 @@ class SearchResult(db.Model):
             'query': self.query,
             'result_json': self.result_json,
             'saved_file': self.saved_file,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'search_type': self.search_type,
+            'hit_count': self.hit_count,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'last_run_at': self.last_run_at.isoformat() if self.last_run_at else None
         }
+
+    @staticmethod
+    def compress_results(results: list) -> bytes:
+        return zlib.compress(json.dumps(results, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+    def snapshot_results(self) -> list | None:
+        """Descomprime la copia de los resultados, si se guardó."""
+        if not self.snapshot:
+            return None
+        return json.loads(zlib.decompress(self.snapshot).decode('utf-8'))
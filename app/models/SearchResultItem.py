@@ -0,0 +1,34 @@
+"""
+Módulo que define el modelo SearchResultItem: cada candidato devuelto por una búsqueda
+del historial, guardado como referencia (document_id, posición, score) en lugar de
+una copia completa del perfil.
+"""
+
+from app.extensions import db
+
+class SearchResultItem(db.Model):
+    """
+    Modelo que representa un candidato dentro de un resultado de búsqueda.
+
+    Atributos:
+        id: Identificador único
+        search_result_id: ID de la búsqueda del historial
+        document_id: ID del documento del candidato (sin clave foránea: el historial sobrevive al borrado)
+        rank: Posición del candidato en el resultado (desde 1)
+        score: similarity_percentage final del candidato
+        details: Nombre de archivo, desglose de scores y keywords encontradas/faltantes
+    """
+    __tablename__ = 'search_result_items'
+
+    id = db.Column(db.Integer, primary_key=True)
+    search_result_id = db.Column(db.Integer, db.ForeignKey('search_results.id', ondelete='CASCADE'), nullable=False, index=True)
+    document_id = db.Column(db.Integer, nullable=False, index=True)
+    rank = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Float, nullable=False)
+    details = db.Column(db.JSON, nullable=True)
+
+    # Relaciones
+    search_result = db.relationship('SearchResult', back_populates='items')
+
+    def __repr__(self):
+        return f'<SearchResultItem search_result_id={self.search_result_id} rank={self.rank} document_id={self.document_id}>'
@@ -7,6 +7,9 @@ y asegurar que las relaciones de SQLAlchemy se configuren correctamente.
 from .User import User
 from .Document import Document
 from .VectorEmbedding import VectorEmbedding
+from .Candidate import Candidate
+from .Result import SearchResult
+from .SearchResultItem import SearchResultItem
 
 
 # Otros modelos comentados hasta que se implementen
@@ -157,4 +157,15 @@ Resultado: {"critical_keywords": ["javascript"]}
 
 ---
 Consulta a analizar:
-"""
\ No newline at end of file
+"""
+
+BATCH_QUERY_EXPANSION_PROMPT = QUERY_EXPANSION_PROMPT.rsplit("---", 1)[0] + """
+MODO POR LOTES:
+Vas a recibir VARIAS consultas numeradas. Aplica las instrucciones anteriores a cada una por separado y devuelve ÚNICAMENTE un JSON (sin explicaciones) con exactamente un perfil por consulta, en el mismo orden:
+{
+  "perfiles": ["perfil de la consulta 1", "perfil de la consulta 2"]
+}
+
+---
+Consultas originales:
+"""
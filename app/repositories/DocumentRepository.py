@@ -10,6 +10,9 @@ from flask import current_app
 import traceback
 import datetime
 from sqlalchemy.orm import joinedload
+from sqlalchemy import delete, select, func
+from app.services.LexicalIndexService import candidate_search_fields, normalize_text
+from app.repositories.FullTextSearch import keywords_tsquery
 
 class DocumentRepository(Create, Read, Update, Delete):
 
@@ -92,6 +95,14 @@ class DocumentRepository(Create, Read, Update, Delete):
         """Retorna todos los documentos."""
         return Document.query.all()
 
+    def find_candidates_by_document_ids(self, document_ids: list[int]) -> list[Candidate]:
+        """
+        Carga en una sola consulta los candidatos (con su documento) de varios IDs de documento.
+        """
+        if not document_ids:
+            return []
+        return Candidate.query.options(joinedload(Candidate.document)).filter(Candidate.document_id.in_(document_ids)).all()
+
     def find_by_filename_and_user(self, filename: str, user_id: int) -> Document | None:
         """
         Busca un documento por nombre de archivo y usuario, aplicando normalización.
@@ -133,6 +144,7 @@ class DocumentRepository(Create, Read, Update, Delete):
                 experiencia_profesional=profile_data.get("Experiencia Profesional", []),
                 educacion=profile_data.get("Educación", [])
             )
+            self._refresh_candidate_search_fields(new_candidate)
             db.session.add(new_candidate)
             db.session.commit()
             current_app.logger.debug(f"[DEBUG] DB: Candidato '{new_candidate.nombre_completo}' insertado con ID: {new_candidate.id}.")
@@ -153,6 +165,7 @@ class DocumentRepository(Create, Read, Update, Delete):
         """
         current_app.logger.debug(f"[DEBUG] DB: Ejecutando UPDATE para el candidato ID {candidate.id} y el documento ID {document.id} en una transacción.")
         try:
+            self._refresh_candidate_search_fields(candidate)
             candidate.updated_at = datetime.datetime.utcnow()
             document.updated_at = datetime.datetime.utcnow()
             db.session.commit()
@@ -168,6 +181,11 @@ class DocumentRepository(Create, Read, Update, Delete):
             )
             raise
 
+    @staticmethod
+    def _refresh_candidate_search_fields(candidate: Candidate):
+        """Recalcula el texto y los tokens de búsqueda normalizados del candidato."""
+        candidate.search_text, candidate.search_tokens = candidate_search_fields(candidate.to_dict())
+
     def save_vector_embedding(self, vector_embedding: VectorEmbedding):
         """
         Guarda un registro de VectorEmbedding en la base de datos.
@@ -188,21 +206,64 @@ class DocumentRepository(Create, Read, Update, Delete):
             )
     
 
+    def search_candidates_fulltext(self, keywords: list[str], limit: int) -> list[tuple[int, float]]:
+        """
+        Busca candidatos que contengan cualquiera de las keywords usando el índice GIN sobre
+        search_vector. Devuelve [(document_id, rank)] ordenado por ts_rank_cd descendente.
+        """
+        # search_text está normalizado sin tildes, así que las keywords se normalizan igual
+        tsquery = keywords_tsquery([normalize_text(keyword) for keyword in keywords if keyword])
+        if tsquery is None:
+            return []
+        rank = func.ts_rank_cd(Candidate.search_vector, tsquery)
+        statement = (
+            select(Candidate.document_id, rank)
+            .where(Candidate.search_vector.op('@@')(tsquery))
+            .order_by(rank.desc())
+            .limit(limit)
+        )
+        return [(document_id, float(score)) for document_id, score in db.session.execute(statement).all()]
+
     def find_all_by_user_id(self, user_id: int):
         """Encuentra todos los documentos de un usuario específico."""
         return Document.query.filter_by(user_id=user_id).all()
 
-    def delete_all_by_user_id(self, user_id: int):
-        """Elimina todos los documentos de un usuario específico."""
+    def find_ids_and_storage_paths_by_user_id(self, user_id: int) -> list[tuple[int, str | None]]:
+        """Devuelve solo (id, storage_path) de los documentos de un usuario, sin cargar entidades."""
+        return db.session.execute(
+            select(Document.id, Document.storage_path).where(Document.user_id == user_id)
+        ).all()
+
+    def delete_all_by_user_id(self, user_id: int) -> int:
+        """
+        Elimina todos los documentos de un usuario junto con sus candidatos y embeddings.
+        Usa una sentencia DELETE por tabla dentro de una única transacción.
+        """
+        current_app.logger.debug(f"[DEBUG] DB: Ejecutando DELETE masivo de documentos para el usuario ID {user_id}.")
         try:
-            documents = Document.query.filter_by(user_id=user_id).all()
-            deleted_count = len(documents)
-            
-            for doc in documents:
-                db.session.delete(doc)
-            
+            user_document_ids = select(Document.id).where(Document.user_id == user_id)
+            db.session.execute(
+                delete(VectorEmbedding).where(VectorEmbedding.document_id.in_(user_document_ids)),
+                execution_options={'synchronize_session': False}
+            )
+            db.session.execute(
+                delete(Candidate).where(Candidate.document_id.in_(user_document_ids)),
+                execution_options={'synchronize_session': False}
+            )
+            result = db.session.execute(
+                delete(Document).where(Document.user_id == user_id),
+                execution_options={'synchronize_session': False}
+            )
             db.session.commit()
-            return deleted_count
+            db.session.expire_all()
+            current_app.logger.debug(f"[DEBUG] DB: Eliminados {result.rowcount} documentos del usuario ID {user_id}.")
+            return result.rowcount
         except Exception as e:
             db.session.rollback()
-            raise e
\ No newline at end of file
+            error_details = traceback.format_exc()
+            current_app.logger.error(
+                f"[ERROR] DB: Falló el DELETE masivo de documentos del usuario ID {user_id}. Se ejecutó un rollback.\n"
+                f"  [Causa] {str(e)}\n"
+                f"  [TRACEBACK]\n{error_details}"
+            )
+            raise
@@ -0,0 +1,41 @@
+"""
+Utilidades de búsqueda de texto completo de PostgreSQL (tsvector + índices GIN).
+
+Las columnas search_vector de candidates y search_results son columnas generadas que
+combinan las configuraciones 'spanish' y 'english'; las consultas se construyen con
+las mismas configuraciones para que el stemming coincida de ambos lados.
+"""
+
+import re
+from sqlalchemy import func
+
+FTS_CONFIGS = ('spanish', 'english')
+
+
+def keywords_tsquery(keywords: list[str]):
+    """
+    tsquery que encuentra cualquiera de las keywords; las de varias palabras se buscan
+    como frase. Devuelve None si no hay keywords.
+    """
+    tsquery = None
+    for keyword in keywords:
+        for config in FTS_CONFIGS:
+            part = func.phraseto_tsquery(config, keyword)
+            tsquery = part if tsquery is None else tsquery.op('||')(part)
+    return tsquery
+
+
+def prefix_tsquery(text: str):
+    """
+    tsquery que exige todas las palabras del texto como prefijo ('desarr' encuentra
+    'desarrollador'). Devuelve None si el texto no tiene palabras.
+    """
+    words = re.findall(r'\w+', (text or '').lower())
+    if not words:
+        return None
+    expression = ' & '.join(f'{word}:*' for word in words)
+    tsquery = None
+    for config in FTS_CONFIGS:
+        part = func.to_tsquery(config, expression)
+        tsquery = part if tsquery is None else tsquery.op('||')(part)
+    return tsquery
@@ -7,8 +7,9 @@ Versión actualizada a la sintaxis moderna de SQLAlchemy 2.0.
 from app.extensions import db
 from app.models.Result import SearchResult
 from app.repositories.RepositoryBase import Create, Read
-from sqlalchemy import desc, func
+from sqlalchemy import desc, func, tuple_, delete, or_
 from sqlalchemy.exc import IntegrityError
+from app.repositories.FullTextSearch import prefix_tsquery
 import traceback
 
 class SearchResultRepository(Create, Read):
@@ -28,6 +29,25 @@ class SearchResultRepository(Create, Read):
             db.session.rollback()
             raise Exception(f"Error al crear el resultado de búsqueda: {str(e)}")
 
+    def create_many(self, entities: list[SearchResult]):
+        """
+        Inserta varios resultados de búsqueda en una sola transacción.
+        """
+        try:
+            db.session.add_all(entities)
+            db.session.commit()
+            return entities
+        except Exception as e:
+            db.session.rollback()
+            raise Exception(f"Error al crear {len(entities)} resultados de búsqueda: {str(e)}")
+
+    def reserve_id(self) -> int:
+        """
+        Reserva el próximo ID de la secuencia de search_results sin insertar la fila,
+        para poder devolverlo antes de que el escritor en segundo plano la guarde.
+        """
+        return db.session.execute(db.select(func.nextval('search_results_id_seq'))).scalar_one()
+
     def find_by_id(self, id: int):
         """
         Busca un resultado por su ID usando el método moderno y optimizado.
@@ -69,15 +89,102 @@ class SearchResultRepository(Create, Read):
 
     def find_by_query_like(self, query_text: str):
         """
-        Busca resultados que contengan el término especificado en la consulta.
+        Busca resultados cuya consulta contenga todas las palabras del texto (como prefijo).
+        Usa el índice GIN sobre search_vector en lugar de un ILIKE '%...%' secuencial.
         """
-        # La ambigüedad con el campo 'query' se resuelve usando el objeto del modelo.
-        search_pattern = f'%{query_text}%'
+        tsquery = prefix_tsquery(query_text)
+        if tsquery is None:
+            return []
         statement = db.select(SearchResult).where(
-            SearchResult.query.ilike(search_pattern)
+            SearchResult.search_vector.op('@@')(tsquery)
         ).order_by(desc(SearchResult.created_at))
         return db.session.execute(statement).scalars().all()
 
+    def find_page(self, limit: int, after: tuple | None = None, query_text: str | None = None):
+        """
+        Obtiene una página del historial con paginación por cursor (keyset) sobre (last_run_at, id),
+        solo con las columnas del listado (sin result_json). `after` es el (last_run_at, id) de la
+        última fila de la página anterior. Devuelve hasta `limit` filas.
+        """
+        statement = db.select(
+            SearchResult.id, SearchResult.query, SearchResult.saved_file, SearchResult.search_type,
+            SearchResult.hit_count, SearchResult.created_at, SearchResult.last_run_at
+        ).order_by(desc(SearchResult.last_run_at), desc(SearchResult.id)).limit(limit)
+
+        if after is not None:
+            statement = statement.where(tuple_(SearchResult.last_run_at, SearchResult.id) < tuple_(*after))
+        if query_text:
+            tsquery = prefix_tsquery(query_text)
+            if tsquery is None:
+                return []
+            statement = statement.where(SearchResult.search_vector.op('@@')(tsquery))
+        return db.session.execute(statement).all()
+
+    def find_id_by_normalized_query(self, query_normalized: str, search_type: str) -> int | None:
+        """
+        Busca la entrada de historial de una consulta ya ejecutada (misma consulta normalizada y modo).
+        """
+        statement = db.select(SearchResult.id).where(
+            SearchResult.query_normalized == query_normalized, SearchResult.search_type == search_type
+        )
+        return db.session.execute(statement).scalar_one_or_none()
+
+    def find_by_normalized_query(self, query_normalized: str, search_type: str) -> SearchResult | None:
+        """
+        Obtiene la entrada de historial de una consulta normalizada y modo (única por restricción).
+        """
+        statement = db.select(SearchResult).where(
+            SearchResult.query_normalized == query_normalized, SearchResult.search_type == search_type
+        )
+        return db.session.execute(statement).scalar_one_or_none()
+
+    def find_expired(self, last_run_before, limit: int) -> list:
+        """
+        Devuelve (id, saved_file) de las entradas cuya última ejecución es anterior a `last_run_before`.
+        """
+        statement = db.select(SearchResult.id, SearchResult.saved_file).where(
+            SearchResult.last_run_at < last_run_before
+        ).order_by(SearchResult.last_run_at).limit(limit)
+        return db.session.execute(statement).all()
+
+    def find_compactable(self, last_run_before, limit: int) -> list[SearchResult]:
+        """
+        Entradas inactivas desde `last_run_before` que todavía tienen resultados completos en
+        result_json o un archivo de resultados sin comprimir.
+        """
+        statement = db.select(SearchResult).where(
+            SearchResult.last_run_at < last_run_before,
+            or_(SearchResult.result_json.isnot(None), SearchResult.saved_file.like('%.json'))
+        ).order_by(SearchResult.last_run_at).limit(limit)
+        return db.session.execute(statement).scalars().all()
+
+    def find_all_saved_files(self) -> set[str]:
+        statement = db.select(SearchResult.saved_file).where(SearchResult.saved_file.isnot(None))
+        return set(db.session.execute(statement).scalars().all())
+
+    def delete_by_ids(self, search_ids: list[int]) -> int:
+        """
+        Elimina varias entradas del historial (y sus items, por ON DELETE CASCADE) en una sentencia.
+        """
+        try:
+            result = db.session.execute(
+                delete(SearchResult).where(SearchResult.id.in_(search_ids)),
+                execution_options={'synchronize_session': False}
+            )
+            db.session.commit()
+            return result.rowcount
+        except Exception as e:
+            db.session.rollback()
+            raise Exception(f"Error al eliminar {len(search_ids)} resultados de búsqueda: {str(e)}")
+
+    def save_all(self):
+        """Confirma los cambios pendientes sobre entidades ya cargadas."""
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            raise Exception(f"Error al guardar los resultados de búsqueda: {str(e)}")
+
     def find_recent(self, limit: int = 10):
         """
         Obtiene los resultados de búsqueda más recientes.
@@ -1,11 +1,21 @@
 import os
+import time
 import boto3
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 from flask import current_app
 import mimetypes
 import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from app.cache import TTLCache
+
+# Compartida entre instancias: el servicio se crea por request
+_presigned_url_cache = TTLCache(max_entries=10000)
 
 class AWSService:
+    DELETE_BATCH_SIZE = 1000  # Máximo de claves por llamada a delete_objects
+
     def __init__(self):
         self.bucket_name = os.getenv('AWS_BUCKET')
         self.s3 = boto3.resource(
@@ -16,46 +26,52 @@ class AWSService:
         )
 
     def subir_pdf(self, ruta_archivo_local, nombre_archivo):
-        try:
-            # Verificar si el archivo ya existe en S3
-            s3_path = f"curriculums/{nombre_archivo}"
-            try:
-                self.s3.Object(self.bucket_name, s3_path).load()
-                # Si el archivo ya existe, generar un nombre único
-                base, ext = os.path.splitext(nombre_archivo)
-                nombre_archivo = f"{base}_{uuid.uuid4().hex[:8]}{ext}"
-                s3_path = f"curriculums/{nombre_archivo}"
-                current_app.logger.warning(f"Archivo {nombre_archivo} ya existe, generado nuevo nombre: {s3_path}")
-            except ClientError as e:
-                if e.response['Error']['Code'] != '404':
-                    raise  # Re-lanzar si el error no es "no encontrado"
+        """
+        Sube un archivo local a S3 en streaming mediante el transfer manager de boto3
+        (multipart y concurrente para archivos grandes, sin cargarlo completo en memoria).
+
+        La clave incluye un prefijo UUID, por lo que es única por construcción y no hace falta
+        consultar antes si el objeto existe.
 
+        Returns:
+            tuple: (URL del archivo, clave S3) o (None, None) si la subida falló.
+        """
+        s3_path = f"curriculums/{uuid.uuid4().hex}/{nombre_archivo}"
+        try:
             # Determinar el ContentType según la extensión del archivo
-            extension = os.path.splitext(ruta_archivo_local)[1].lower()
             content_type, _ = mimetypes.guess_type(ruta_archivo_local)
             if content_type is None:
                 content_type = 'application/octet-stream'  # Valor por defecto si no se detecta
 
-            with open(ruta_archivo_local, "rb") as archivo:
-                data = archivo.read()
-                self.s3.Bucket(self.bucket_name).put_object(
-                    Key=s3_path,
-                    Body=data,
-                    ContentType=content_type,
-                    ContentDisposition='inline'
-                )
-                url = f"https://{self.bucket_name}.s3.{os.getenv('AWS_REGION')}.amazonaws.com/{s3_path}"
-                current_app.logger.info(f"✅ Archivo subido a S3: {url}")
-                return url, nombre_archivo  # Devolver la URL y el nombre del archivo (potencialmente modificado)
+            self.s3.Bucket(self.bucket_name).upload_file(
+                ruta_archivo_local,
+                s3_path,
+                ExtraArgs={'ContentType': content_type, 'ContentDisposition': 'inline'},
+                Config=self._transfer_config()
+            )
+            url = self.get_file_url(s3_path)
+            current_app.logger.info(f"✅ Archivo subido a S3: {url}")
+            return url, s3_path
         except FileNotFoundError:
             current_app.logger.error("❌ Archivo no encontrado.")
-            return None, nombre_archivo
+            return None, None
+        except S3UploadFailedError as e:
+            current_app.logger.error(f"❌ Error al subir a S3: {str(e)}")
+            return None, None
         except ClientError as e:
             current_app.logger.error(f"❌ Error al subir a S3: {e.response['Error']['Message']}")
-            return None, nombre_archivo
+            return None, None
         except Exception as e:
             current_app.logger.error(f"❌ Error inesperado en subida a S3: {str(e)}")
-            return None, nombre_archivo
+            return None, None
+
+    def _transfer_config(self):
+        return TransferConfig(
+            multipart_threshold=current_app.config.get('S3_MULTIPART_THRESHOLD', 8 * 1024 * 1024),
+            multipart_chunksize=current_app.config.get('S3_MULTIPART_CHUNKSIZE', 8 * 1024 * 1024),
+            max_concurrency=current_app.config.get('S3_UPLOAD_MAX_CONCURRENCY', 4),
+            use_threads=True
+        )
 
     def get_file_url(self, s3_path):
         try:
@@ -65,6 +81,46 @@ class AWSService:
             current_app.logger.error(f"❌ Error generando URL para {s3_path}: {str(e)}")
             return None
         
+    def generar_url_firmada(self, s3_path, expires_in=None):
+        """
+        Genera una URL prefirmada de corta duración para descargar un archivo.
+
+        Returns:
+            str: URL prefirmada, o None si no se pudo generar.
+        """
+        return self.generar_url_firmada_con_vencimiento(s3_path, expires_in)[0]
+
+    def generar_url_firmada_con_vencimiento(self, s3_path, expires_in=None):
+        """
+        Como generar_url_firmada, pero devuelve también los segundos de validez que le quedan.
+        Las URLs se cachean por (ruta, expiración) junto con su vencimiento absoluto y se
+        reutilizan mientras les quede al menos un 20% de su vida útil.
+
+        Returns:
+            tuple: (URL prefirmada o None, segundos restantes de validez).
+        """
+        expires_in = expires_in or current_app.config.get('PRESIGNED_URL_EXPIRATION', 900)
+        cache_key = (s3_path, expires_in)
+        cached = _presigned_url_cache.get(cache_key)
+        if cached:
+            url, expires_at = cached
+            return url, max(0, int(expires_at - time.time()))
+        try:
+            expires_at = time.time() + expires_in
+            url = self.s3.meta.client.generate_presigned_url(
+                'get_object',
+                Params={'Bucket': self.bucket_name, 'Key': s3_path},
+                ExpiresIn=expires_in
+            )
+            _presigned_url_cache.set(cache_key, (url, expires_at), ttl=expires_in * 0.8)
+            return url, expires_in
+        except ClientError as e:
+            current_app.logger.error(f"❌ Error generando URL prefirmada para {s3_path}: {e.response['Error']['Message']}")
+            return None, 0
+        except Exception as e:
+            current_app.logger.error(f"❌ Error inesperado generando URL prefirmada para {s3_path}: {str(e)}")
+            return None, 0
+
     def borrar_archivo(self, s3_path):
         """
         Elimina un archivo del bucket S3 en la ruta especificada.
@@ -91,4 +147,50 @@ class AWSService:
             return False
         except Exception as e:
             current_app.logger.error(f"❌ Error inesperado al eliminar archivo de S3: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+
+    def borrar_archivos_lote(self, s3_paths):
+        """
+        Elimina varios archivos de S3 usando delete_objects en lotes de hasta 1000 claves.
+        Los lotes se envían en paralelo.
+
+        Args:
+            s3_paths (list): Rutas de los archivos en el bucket.
+
+        Returns:
+            list: Rutas que no pudieron eliminarse (lista vacía si todo salió bien).
+        """
+        keys = list(dict.fromkeys(path for path in s3_paths if path))
+        if not keys:
+            return []
+
+        batches = [keys[i:i + self.DELETE_BATCH_SIZE] for i in range(0, len(keys), self.DELETE_BATCH_SIZE)]
+        max_workers = min(len(batches), current_app.config.get('S3_DELETE_MAX_CONCURRENCY', 4))
+        client = self.s3.meta.client  # Los clientes de boto3 son thread-safe, los recursos no
+
+        failed_paths = []
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="s3-delete") as executor:
+            futures = {executor.submit(self._borrar_lote, client, batch): batch for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    errors = future.result()
+                    for error in errors:
+                        current_app.logger.warning(f"⚠️ No se pudo eliminar de S3 '{error['Key']}': {error.get('Code')} {error.get('Message')}")
+                    failed_paths.extend(error['Key'] for error in errors)
+                except ClientError as e:
+                    current_app.logger.error(f"❌ Error al eliminar lote de {len(batch)} archivos de S3: {e.response['Error']['Message']}")
+                    failed_paths.extend(batch)
+                except Exception as e:
+                    current_app.logger.error(f"❌ Error inesperado al eliminar lote de {len(batch)} archivos de S3: {str(e)}")
+                    failed_paths.extend(batch)
+
+        current_app.logger.info(f"✅ Eliminados de S3 {len(keys) - len(failed_paths)} de {len(keys)} archivos en {len(batches)} lote(s)")
+        return failed_paths
+
+    def _borrar_lote(self, client, keys):
+        response = client.delete_objects(
+            Bucket=self.bucket_name,
+            Delete={'Objects': [{'Key': key} for key in keys], 'Quiet': True}
+        )
+        return response.get('Errors', [])
@@ -4,15 +4,17 @@ import os
 import traceback
 from datetime import datetime
 from flask import current_app
-import PyPDF2
 import numpy as np
-from app.extensions import db, get_faiss_index, save_faiss_index
+from app.extensions import db, get_faiss_index, save_faiss_index, bump_index_version
 from app.models.Document import Document
 from app.models.VectorEmbedding import VectorEmbedding
 from app.repositories.DocumentRepository import DocumentRepository
 from app.services.OpenAIService import OpenAIRewriteService
 from app.services.OpenAIVisionService import OpenAIVisionService
-from app.services.AwsService import AWSService
+from app.services.PdfProcessingPool import run_pdf_task, extract_pdf_pages_text
+from app.services.StorageService import create_storage_backend
+from app.background import run_in_background
+from app.services.LexicalIndexService import index_candidate, remove_documents_from_lexical_index
 from app.models.Candidate import Candidate
 
 UPLOAD_FOLDER = 'Uploads'
@@ -22,15 +24,18 @@ class DocumentService:
         self.repo = DocumentRepository()
         self.rewrite_service = OpenAIRewriteService()
         self.vision_service = OpenAIVisionService()
-        self.aws_service = AWSService()
+        self.storage = create_storage_backend()
         self.aws_bucket = aws_bucket
         self.MIN_TEXT_LENGTH = 100
         self.MIN_VISION_TEXT_LENGTH = 400
+        self.VISION_PAGE_MIN_CHARS = current_app.config.get('VISION_PAGE_MIN_CHARS', 50)
 
-    def process_pdf(self, file_path: str, user_id: int, filename: str, use_vision: bool = False, ai_plus_enabled: bool = False) -> dict:
+    def process_pdf(self, file_path: str, user_id: int, filename: str, use_vision: bool = False, ai_plus_enabled: bool = False, auto_vision: bool = False) -> dict:
         """
         Orquesta el proceso completo de un PDF: validación, extracción, guardado,
         generación de perfil, embedding enfocado y subida a S3.
+        Con auto_vision, si el texto de PyPDF2 es insuficiente se pasa a Vision en el mismo
+        proceso en lugar de devolver 'needs_vision' al cliente.
         """
         try:
             # LOGS CRÍTICOS PARA DEBUGGING - Misma estrategia que el controlador
@@ -47,7 +52,8 @@ class DocumentService:
                     current_app.logger.critical(f"⚠️  [SERVICIO] El documento '{filename}' ya existe. Finalizando.")
                     return {'success': False, 'filename': filename, 'reason': 'El documento ya existe.', 'status': 409}
 
-            if not self._is_valid_pdf(file_path):
+            page_texts = self._extract_pages_pypdf2(file_path)
+            if page_texts is None:
                 print(f"❌ [SERVICIO] El archivo '{filename}' no es un PDF válido. Finalizando.", flush=True)
                 current_app.logger.critical(f"❌ [SERVICIO] El archivo '{filename}' no es un PDF válido. Finalizando.")
                 return {'success': False, 'filename': filename, 'reason': 'No es un PDF válido o está dañado.', 'status': 400}
@@ -56,13 +62,23 @@ class DocumentService:
             print(f"🔄 [SERVICIO] [Paso 2/7] Extrayendo texto con {extraction_method} para '{filename}'", flush=True)
             current_app.logger.critical(f"🔄 [SERVICIO] [Paso 2/7] Extrayendo texto con {extraction_method} para '{filename}'")
             
-            extracted_text = self.vision_service.extract_text_from_pdf_with_vision(file_path) if use_vision else self._extract_text_pypdf2(file_path)
+            extracted_text = self._extract_text_hybrid(file_path, page_texts) if use_vision else self._join_page_texts(page_texts)
             
             # --- LOG DE DEPURACIÓN CLAVE ---
             text_length = len(extracted_text.strip())
             print(f"📏 [SERVICIO] Longitud del texto extraído para '{filename}': {text_length} caracteres", flush=True)
             current_app.logger.critical(f"📏 [SERVICIO] Longitud del texto extraído para '{filename}': {text_length} caracteres")
             # --- FIN DEL LOG DE DEPURACIÓN CLAVE ---
+
+            if not use_vision and auto_vision and (not extracted_text or text_length < self.MIN_TEXT_LENGTH):
+                print(f"👁️  [SERVICIO] Texto insuficiente para '{filename}'. Fallback automático a Vision reutilizando las páginas ya extraídas", flush=True)
+                current_app.logger.critical(f"👁️  [SERVICIO] Texto insuficiente para '{filename}'. Fallback automático a Vision reutilizando las páginas ya extraídas")
+                use_vision = True
+                extraction_method = "Vision/OCR"
+                extracted_text = self._extract_text_hybrid(file_path, page_texts)
+                text_length = len(extracted_text.strip())
+                print(f"📏 [SERVICIO] Longitud del texto extraído con Vision para '{filename}': {text_length} caracteres", flush=True)
+                current_app.logger.critical(f"📏 [SERVICIO] Longitud del texto extraído con Vision para '{filename}': {text_length} caracteres")
             
             min_length = self.MIN_VISION_TEXT_LENGTH if use_vision else self.MIN_TEXT_LENGTH
             if not extracted_text or text_length < min_length:
@@ -120,23 +136,23 @@ class DocumentService:
             
             embedding_list = self.rewrite_service.generate_embedding(search_document_text)
             self._save_embedding_to_faiss(saved_document.id, embedding_list)
+            index_candidate(candidate_profile)
 
             print(f"☁️  [SERVICIO] [Paso 6/7] Subiendo '{filename}' a S3", flush=True)
             current_app.logger.critical(f"☁️  [SERVICIO] [Paso 6/7] Subiendo '{filename}' a S3")
             
-            file_url, final_s3_filename = self.aws_service.subir_pdf(file_path, filename)
-            if file_url is None:
+            file_url, s3_key = self.storage.put(file_path, filename)
+            if s3_key is None:
                 print(f"❌ [SERVICIO] Fallo en subida a S3 para '{filename}'", flush=True)
                 current_app.logger.critical(f"❌ [SERVICIO] Fallo en subida a S3 para '{filename}'")
-                raise Exception("Fallo en la subida del archivo a S3. El servicio AWS no retornó una URL.")
+                raise Exception("Fallo en la subida del archivo al almacenamiento. El backend no retornó una clave.")
             
-            print(f"✅ [SERVICIO] Archivo subido a S3: {final_s3_filename}", flush=True)
-            current_app.logger.critical(f"✅ [SERVICIO] Archivo subido a S3: {final_s3_filename}")
+            print(f"✅ [SERVICIO] Archivo subido a S3: {s3_key}", flush=True)
+            current_app.logger.critical(f"✅ [SERVICIO] Archivo subido a S3: {s3_key}")
             
             update_data = {
-                'storage_path': f"curriculums/{final_s3_filename}",
+                'storage_path': s3_key,
                 'file_url': file_url,
-                'filename': final_s3_filename,
                 'status': 'processed'
             }
             updated_document = self.repo.update(saved_document, saved_document.id, update_data)
@@ -177,6 +193,8 @@ class DocumentService:
             try:
                 candidate = self.create_candidate_from_text(document.rewritten_text, document.id)
                 if candidate:
+                    index_candidate(candidate)
+                    bump_index_version()
                     profile_data = candidate.to_dict()
             except Exception as e:
                 current_app.logger.warning(f"[ADVERTENCIA] No se pudo auto-generar el perfil para el documento {document_id} al solicitar sus detalles. Causa: {e}")
@@ -211,6 +229,8 @@ class DocumentService:
                     setattr(document.candidate, attribute_name, value)
             
             updated_candidate = self.repo.save_candidate_and_document_update(document.candidate, document)
+            index_candidate(updated_candidate)
+            bump_index_version()
             return {'success': True, 'data': updated_candidate.to_dict(), 'status': 200}
         except Exception as e:
             current_app.logger.error(f"[ERROR] Falla en la capa de servicio al actualizar el perfil del candidato para el documento {document_id}. Causa: {e}")
@@ -222,7 +242,7 @@ class DocumentService:
             if not document:
                 return {'success': False, 'message': 'Archivo no encontrado en la base de datos', 'status': 404}
 
-            if not self.aws_service.borrar_archivo(s3_path):
+            if self.storage.delete_many([s3_path]):
                 current_app.logger.warning(f"[ADVERTENCIA] No se pudo eliminar el archivo de S3 en la ruta '{s3_path}'. Se procederá a eliminar los registros de la base de datos de todos modos.")
             
             faiss_idx = get_faiss_index()
@@ -232,6 +252,8 @@ class DocumentService:
                 current_app.logger.debug(f"[DEBUG] Embedding vectorial para el documento {document.id} ha sido eliminado del índice FAISS.")
 
             self.repo.delete(document)
+            remove_documents_from_lexical_index([document.id])
+            bump_index_version()
             return {'success': True, 'message': 'Archivo y todos sus datos asociados han sido eliminados', 'status': 200}
         except Exception as e:
             error_details = traceback.format_exc()
@@ -245,9 +267,12 @@ class DocumentService:
     def delete_all_user_documents(self, user_id: int) -> dict:
         """
         Elimina todos los documentos de un usuario específico incluyendo:
-        - Archivos en S3
-        - Registros en base de datos
-        - Índices vectoriales en FAISS
+        - Registros en base de datos (una sentencia DELETE por tabla)
+        - Índices vectoriales en FAISS (una sola llamada a remove_ids)
+        - Archivos en el almacenamiento (en segundo plano)
+        
+        La respuesta se devuelve en cuanto los datos dejan de ser visibles (BD y FAISS);
+        la persistencia del índice y el borrado de archivos continúan en segundo plano.
         
         Args:
             user_id (int): ID del usuario
@@ -256,10 +281,10 @@ class DocumentService:
             dict: Resultado de la operación con estadísticas
         """
         try:
-            # Obtener todos los documentos del usuario
-            user_documents = self.repo.find_all_by_user_id(user_id)
+            # Obtener solo IDs y rutas, sin cargar las entidades
+            document_refs = self.repo.find_ids_and_storage_paths_by_user_id(user_id)
             
-            if not user_documents:
+            if not document_refs:
                 current_app.logger.info(f"[INFO] No se encontraron documentos para el usuario {user_id}")
                 return {
                     'success': True, 
@@ -268,30 +293,17 @@ class DocumentService:
                     'deleted_count': 0
                 }
 
-            total_documents = len(user_documents)
-            document_ids = [doc.id for doc in user_documents]
-            s3_paths = [doc.storage_path for doc in user_documents if doc.storage_path]
+            document_ids = [doc_id for doc_id, _ in document_refs]
+            s3_paths = [path for _, path in document_refs if path]
             
             current_app.logger.info(
                 f"[INFO] Iniciando eliminación completa para usuario {user_id}. "
-                f"Documentos a eliminar: {total_documents}"
+                f"Documentos a eliminar: {len(document_ids)}"
             )
 
-            # Estadísticas para el resultado
-            failed_s3_deletions = 0
-            
-            # 1. Eliminar archivos de S3
-            if s3_paths:
-                current_app.logger.debug(f"[DEBUG] Eliminando {len(s3_paths)} archivos de S3")
-                failed_s3_deletions = self._delete_s3_files_batch(s3_paths, user_id)
-            
-            # 2. Eliminar índices FAISS
-            if document_ids:
-                self._remove_faiss_indices_batch(document_ids)
-            
-            # 3. Eliminar registros de base de datos (en transacción)
+            # 1. Eliminar registros de base de datos (en transacción)
             try:
-                self.repo.delete_all_by_user_id(user_id)
+                total_documents = self.repo.delete_all_by_user_id(user_id)
                 current_app.logger.info(
                     f"[INFO] Eliminados {total_documents} registros de base de datos para usuario {user_id}"
                 )
@@ -302,23 +314,29 @@ class DocumentService:
                 # Si falla la BD, es un error crítico
                 raise db_error
 
-            # Preparar mensaje de resultado
-            if failed_s3_deletions == 0:
-                message = f'Eliminación completa exitosa: {total_documents} documentos y todos sus datos asociados han sido eliminados'
-            else:
-                message = f'Eliminación mayormente exitosa: {total_documents} documentos eliminados de BD y FAISS, pero {failed_s3_deletions} archivos no pudieron eliminarse de S3'
+            # 2. Quitar los vectores y el texto de los índices en memoria para que no aparezcan en búsquedas
+            self._remove_faiss_indices_batch(document_ids, persist=False)
+            remove_documents_from_lexical_index(document_ids)
+            bump_index_version()
+
+            # 3. Guardar el índice y borrar los archivos fuera de la petición
+            run_in_background(
+                current_app._get_current_object(),
+                f'delete-all-cleanup-user-{user_id}',
+                self._finish_user_documents_cleanup, s3_paths, user_id
+            )
 
             current_app.logger.info(
                 f"[ÉXITO] Eliminación completa finalizada para usuario {user_id}. "
-                f"Documentos: {total_documents}, Fallos S3: {failed_s3_deletions}"
+                f"Documentos: {total_documents}. Archivos pendientes de borrar en segundo plano: {len(s3_paths)}"
             )
 
             return {
                 'success': True,
-                'message': message,
+                'message': f'Eliminación completa exitosa: {total_documents} documentos y todos sus datos asociados han sido eliminados',
                 'status': 200,
                 'deleted_count': total_documents,
-                'failed_s3_deletions': failed_s3_deletions
+                'pending_file_deletions': len(s3_paths)
             }
 
         except Exception as e:
@@ -334,9 +352,19 @@ class DocumentService:
                 'status': 500
             }
 
+    def _finish_user_documents_cleanup(self, s3_paths: list, user_id: int):
+        """Tarea en segundo plano: persiste el índice FAISS y borra los archivos del almacenamiento."""
+        save_faiss_index()
+        if s3_paths:
+            failed_count = self._delete_s3_files_batch(s3_paths, user_id)
+            current_app.logger.info(
+                f"[INFO] Limpieza en segundo plano finalizada para usuario {user_id}. "
+                f"Archivos eliminados: {len(s3_paths) - failed_count}, fallidos: {failed_count}"
+            )
+
     def _delete_s3_files_batch(self, s3_paths: list, user_id: int) -> int:
         """
-        Elimina múltiples archivos de S3 en lote.
+        Elimina múltiples archivos del almacenamiento en lote.
         
         Args:
             s3_paths (list): Lista de rutas S3 a eliminar
@@ -348,30 +376,14 @@ class DocumentService:
         failed_count = 0
         
         try:
-            # Si el servicio AWS soporta eliminación en lote, úsalo
-            if hasattr(self.aws_service, 'borrar_archivos_lote'):
-                failed_paths = self.aws_service.borrar_archivos_lote(s3_paths)
-                failed_count = len(failed_paths)
-                
-                if failed_count > 0:
-                    current_app.logger.warning(
-                        f"[ADVERTENCIA] {failed_count} archivos no pudieron eliminarse de S3 "
-                        f"para usuario {user_id}: {failed_paths[:5]}{'...' if len(failed_paths) > 5 else ''}"
-                    )
-            else:
-                # Eliminación individual como fallback
-                for s3_path in s3_paths:
-                    try:
-                        if not self.aws_service.borrar_archivo(s3_path):
-                            failed_count += 1
-                            current_app.logger.warning(
-                                f"[ADVERTENCIA] No se pudo eliminar archivo S3: {s3_path}"
-                            )
-                    except Exception as e:
-                        failed_count += 1
-                        current_app.logger.warning(
-                            f"[ADVERTENCIA] Error eliminando archivo S3 {s3_path}: {str(e)}"
-                        )
+            failed_paths = self.storage.delete_many(s3_paths)
+            failed_count = len(failed_paths)
+            
+            if failed_count > 0:
+                current_app.logger.warning(
+                    f"[ADVERTENCIA] {failed_count} archivos no pudieron eliminarse del almacenamiento "
+                    f"para usuario {user_id}: {failed_paths[:5]}{'...' if len(failed_paths) > 5 else ''}"
+                )
                         
         except Exception as e:
             current_app.logger.error(
@@ -381,12 +393,13 @@ class DocumentService:
         
         return failed_count
 
-    def _remove_faiss_indices_batch(self, document_ids: list):
+    def _remove_faiss_indices_batch(self, document_ids: list, persist: bool = True):
         """
         Elimina múltiples índices FAISS en lote.
         
         Args:
             document_ids (list): Lista de IDs de documentos
+            persist (bool): Si es True guarda el índice en disco a continuación
         """
         try:
             faiss_idx = get_faiss_index()
@@ -394,7 +407,8 @@ class DocumentService:
                 # Convertir a numpy array como requiere FAISS
                 ids_array = np.array(document_ids, dtype=np.int64)
                 faiss_idx.remove_ids(ids_array)
-                save_faiss_index()
+                if persist:
+                    save_faiss_index()
                 
                 current_app.logger.debug(
                     f"[DEBUG] Eliminados {len(document_ids)} embeddings vectoriales del índice FAISS"
@@ -411,12 +425,24 @@ class DocumentService:
             )
             # No re-lanzamos la excepción porque FAISS no es crítico para la operación
             
-    def get_pdf_url(self, user_id: int, filename: str) -> dict:
-        document = self.repo.find_by_filename_and_user(filename, user_id)
-        if not document:
+    def get_pdf_url(self, user_id: int, filename: str | None = None, document_id: int | None = None) -> dict:
+        """
+        Devuelve una URL prefirmada para descargar el PDF. Con document_id la búsqueda es
+        directa por clave primaria; la búsqueda por nombre de archivo se mantiene por compatibilidad.
+        """
+        if document_id is not None:
+            document = self.repo.find_by_id(document_id)
+            if document and document.user_id != user_id:
+                document = None
+        else:
+            document = self.repo.find_by_filename_and_user(filename, user_id)
+        if not document or not document.storage_path or document.storage_path == 'pending':
             return {'success': False}
-        file_url = self.aws_service.get_file_url(document.storage_path)
-        return {'success': True, 'file_url': file_url}
+        # Una URL reutilizada de la caché vence antes: se informa la validez que le queda
+        file_url, expires_in = self.storage.signed_url(document.storage_path, current_app.config.get('PRESIGNED_URL_EXPIRATION', 900))
+        if not file_url:
+            return {'success': False}
+        return {'success': True, 'file_url': file_url, 'expires_in': expires_in}
 
     def get_all_documents(self):
         return self.repo.find_all()
@@ -429,34 +455,80 @@ class DocumentService:
         
         return self.repo.create_candidate(profile_data, document_id)
 
-    def cleanup_temp_file(self, filename: str):
+    @staticmethod
+    def cleanup_temp_file(filename: str) -> bool:
+        """
+        Elimina un archivo del directorio de subidas temporales.
+        Devuelve False solo si el archivo existía y no se pudo eliminar.
+        """
         try:
             temp_path = os.path.join(UPLOAD_FOLDER, filename)
             if os.path.exists(temp_path):
                 os.remove(temp_path)
                 current_app.logger.debug(f"[DEBUG] Archivo temporal eliminado: '{temp_path}'.")
+            return True
+        except FileNotFoundError:
+            return True
         except Exception as e:
             current_app.logger.error(f"[ERROR] No se pudo eliminar el archivo temporal '{filename}'. Causa: {e}.")
+            return False
 
     def _clean_intermediate_files(self, original_filename):
         self.cleanup_temp_file(original_filename)
 
-    def _is_valid_pdf(self, file_path: str) -> bool:
+    def _extract_pages_pypdf2(self, file_path: str) -> list[str] | None:
+        """
+        Extrae el texto de cada página con PyPDF2 (en el pool de procesos si está habilitado).
+        Devuelve None si el archivo no es un PDF válido; una página que falla se devuelve vacía
+        para que pueda resolverse con Vision.
+        """
         try:
-            with open(file_path, 'rb') as file:
-                PyPDF2.PdfReader(file)
-            return True
-        except Exception:
+            page_texts, page_errors = run_pdf_task(extract_pdf_pages_text, file_path)
+        except Exception as e:
+            current_app.logger.error(f"[ERROR] Fallo al leer el PDF '{os.path.basename(file_path)}' con PyPDF2. Causa: {e}.")
+            return None
+        for page_number, error in page_errors:
+            current_app.logger.warning(f"[ADVERTENCIA] PyPDF2 no pudo extraer la página {page_number} de '{os.path.basename(file_path)}'. Causa: {error}.")
+        return page_texts
+
+    def _join_page_texts(self, page_texts: list[str]) -> str:
+        return '\n'.join(text for text in page_texts if text).strip()
+
+    def _has_usable_text_layer(self, page_text: str) -> bool:
+        """
+        Una página tiene capa de texto útil si supera el mínimo de caracteres y el texto no es
+        mayormente basura (fuentes sin mapa Unicode suelen devolver símbolos sueltos).
+        """
+        compact = ''.join(page_text.split())
+        if len(compact) < self.VISION_PAGE_MIN_CHARS:
             return False
+        alnum_ratio = sum(ch.isalnum() for ch in compact) / len(compact)
+        return alnum_ratio >= 0.5
 
-    def _extract_text_pypdf2(self, file_path: str) -> str:
-        try:
-            with open(file_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                return ''.join(page.extract_text() or '' for page in reader.pages).strip()
-        except Exception as e:
-            current_app.logger.error(f"[ERROR] Fallo en la extracción de texto con PyPDF2 para el archivo '{os.path.basename(file_path)}'. Causa: {e}.")
-            return ""
+    def _extract_text_hybrid(self, file_path: str, page_texts: list[str]) -> str:
+        """
+        Extracción por página: las páginas con capa de texto útil usan el texto de PyPDF2 y solo
+        las páginas de imagen se envían a Vision (hasta MAX_PAGES llamadas por documento).
+        """
+        image_pages = [n for n, text in enumerate(page_texts, 1) if not self._has_usable_text_layer(text)]
+
+        if len(image_pages) == len(page_texts):
+            # Documento completamente escaneado: se usa el flujo de Vision que combina secciones entre páginas.
+            return self.vision_service.extract_text_from_pdf_with_vision(file_path)
+
+        vision_pages = image_pages[:self.vision_service.MAX_PAGES]
+        if len(image_pages) > len(vision_pages):
+            current_app.logger.warning(f"[ADVERTENCIA] '{os.path.basename(file_path)}' tiene {len(image_pages)} páginas sin texto; solo se enviarán {len(vision_pages)} a Vision.")
+        current_app.logger.info(f"[INFO] Extracción híbrida de '{os.path.basename(file_path)}': {len(page_texts) - len(image_pages)} páginas con texto, {len(vision_pages)} páginas a Vision.")
+
+        vision_texts = self.vision_service.extract_text_from_pages(file_path, vision_pages) if vision_pages else {}
+        merged_pages = []
+        for page_number, text in enumerate(page_texts, 1):
+            if page_number in vision_texts:
+                merged_pages.append(vision_texts[page_number])
+            elif self._has_usable_text_layer(text):
+                merged_pages.append(text)
+        return '\n\n'.join(merged_pages).strip()
 
     def _save_embedding_to_faiss(self, document_id, embedding_list):
         try:
@@ -467,6 +539,7 @@ class DocumentService:
 
             embedding_vector_np = np.array(embedding_list).astype('float32').reshape(1, -1)
             faiss_idx.add_with_ids(embedding_vector_np, np.array([document_id], dtype=np.int64))
+            bump_index_version()
             save_faiss_index()
 
             vector_embedding_record = VectorEmbedding(
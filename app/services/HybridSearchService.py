@@ -1,16 +1,19 @@
 
-import os
-import json
+import time
 import numpy as np
 from flask import current_app
-from datetime import datetime
 from typing import List, Dict, Tuple
-import re
 
 from app.services.OpenAIService import OpenAIRewriteService
 from app.services.SearchHistoryService import SearchHistoryService
-from app.extensions import get_faiss_index
-from app.models.Candidate import Candidate
+from app.extensions import get_faiss_index, reconstruct_vectors
+from app.background import run_concurrently
+from app.timing import span, record_timing
+from app.repositories.DocumentRepository import DocumentRepository
+from app.services.LexicalIndexService import get_lexical_index, candidate_search_fields
+from app.services.KeywordMatcher import KeywordMatcher
+from app.services.SearchCacheService import search_cache_key, get_cached_search, cache_search_result
+from app.services.SemanticQueryCache import get_semantic_query_cache
 
 class HybridSearchService:
     def __init__(self):
@@ -21,66 +24,292 @@ class HybridSearchService:
         self.semantic_weight = 0.7  # 70% peso semántico
         self.exact_weight = 0.3     # 30% peso exacto
         self.keyword_boost = 15     # Puntos extra por keyword encontrada
+        self.rrf_k = 60             # Constante de Reciprocal Rank Fusion
+        
+        # Texto y tokens de búsqueda precalculados por document_id, cargados junto con los resultados
+        self._search_fields = {}
         
     def perform_hybrid_search(self, query: str, k: int = 10) -> dict:
         """
         Búsqueda híbrida: combina semántica + exacta
         """
-        # Paso 1: Extraer keywords críticas
-        critical_keywords = self.openai_service.extraer_keywords_criticas(query)
-        current_app.logger.info(f"Keywords críticas extraídas: {critical_keywords}")
+        response = None
+        for event, data in self.iter_hybrid_search(query, k):
+            if event == 'final':
+                response = data
+        return response
+
+    def iter_hybrid_search(self, query: str, k: int = 10):
+        """
+        Ejecuta la búsqueda híbrida por etapas y genera (evento, datos) a medida que avanza:
+        - 'semantic': resultados de FAISS, apenas están disponibles;
+        - 'keywords': keywords críticas extraídas por el LLM;
+        - 'final': respuesta completa, re-rankeada y registrada en el historial.
+        Si la consulta está en caché solo se genera 'final'.
+        """
+        # Paso 0: Reutilizar el resultado si la misma consulta ya se resolvió con este índice
+        cache_key = search_cache_key(query, 'hybrid', k)
+        cached_response = get_cached_search(cache_key)
+        if cached_response is not None:
+            # El hit también cuenta en el historial (hit_count y last_run_at de su entrada)
+            with span('history'):
+                search_result_id = self.history_service.record_cache_hit(
+                    query, cached_response, 'hybrid', extra_file_data={'critical_keywords': cached_response.get('critical_keywords', [])}
+                )
+            yield 'final', dict(cached_response, search_result_id=search_result_id)
+            return
+        
+        # Paso 0b: Buscar una consulta reciente casi idéntica (sin pasar por el LLM)
+        index_version = cache_key[-1]
+        semantic_cache = get_semantic_query_cache()
+        raw_query_vector = None
+        if semantic_cache is not None:
+            with span('semantic_cache'):
+                raw_query_vector = self.openai_service.generate_embedding(query)
+                semantic_hit = semantic_cache.lookup(raw_query_vector, 'hybrid', k, index_version)
+            if semantic_hit is not None:
+                cached_response, similarity, original_query = semantic_hit
+                current_app.logger.info(f"Consulta '{query}' resuelta con la caché semántica (similitud {similarity:.3f} con '{original_query}')")
+                # Es otra consulta: se registra con su propia entrada del historial
+                with span('history'):
+                    search_result_id = self.history_service.record_search(
+                        query, cached_response['results'], 'hybrid',
+                        extra_file_data={'critical_keywords': cached_response.get('critical_keywords', []), 'cached_query': original_query}
+                    )
+                response = dict(cached_response, search_result_id=search_result_id)
+                cache_search_result(cache_key, response)
+                yield 'final', dict(response, cached=True, cache_similarity=round(similarity, 4), cached_query=original_query)
+                return
+        
+        # Paso 1: Extraer keywords críticas en paralelo con la expansión, el embedding y FAISS
+        keywords_future = run_concurrently(current_app._get_current_object(), self._extract_keywords_timed, query)
         
         # Paso 2: Búsqueda semántica (tu lógica actual)
-        semantic_results = self._perform_semantic_search(query, k * 2)  # Buscar más candidatos
+        query_vector = self._embed_query(query)
+        semantic_results = self._search_faiss(query_vector, k * 2)  # Buscar más candidatos
+        yield 'semantic', {'results': semantic_results[:k]}
+        
+        critical_keywords, keywords_ms = keywords_future.result()
+        record_timing('llm_keywords', keywords_ms)
+        current_app.logger.info(f"Keywords críticas extraídas: {critical_keywords}")
+        yield 'keywords', {'critical_keywords': critical_keywords}
         
         # Paso 3: Si no hay keywords críticas, devolver solo semántica
         if not critical_keywords:
             current_app.logger.info("No hay keywords críticas, usando solo búsqueda semántica")
             final_results = semantic_results[:k]  # Tomar solo los k mejores
         else:
-            # Paso 4: Aplicar filtro exacto y re-rankear
-            final_results = self._apply_exact_matching(semantic_results, critical_keywords, k)
+            # Paso 4: BM25 sobre todo el corpus, fusión con la semántica y re-rankeo exacto
+            with span('lexical'):
+                lexical_hits = self._perform_lexical_search(critical_keywords, k * 2)
+            with span('fusion'):
+                fused_results = self._fuse_with_lexical_results(semantic_results, lexical_hits, query_vector)
+            with span('rerank'):
+                final_results = self._apply_exact_matching(fused_results, critical_keywords, k)
         
-        # Paso 5: Guardar resultados
-        filename = self._save_results_to_file(query, final_results, critical_keywords)
-        search_result_db = self.history_service.save_search_result(query, final_results, filename)
+        # Paso 5: Registrar en el historial (archivo y BD se escriben en segundo plano)
+        with span('history'):
+            search_result_id = self.history_service.record_search(
+                query, final_results, 'hybrid', extra_file_data={'critical_keywords': critical_keywords}
+            )
         
-        return {
+        response = {
             'results': final_results,
             'critical_keywords': critical_keywords,
-            'search_result_id': search_result_db.id if search_result_db else None
+            'search_result_id': search_result_id
         }
+        cache_search_result(cache_key, response)
+        if semantic_cache is not None:
+            semantic_cache.add(raw_query_vector, query, 'hybrid', k, index_version, response,
+                               ttl=current_app.config.get('SEARCH_CACHE_TTL_SECONDS', 600))
+        yield 'final', response
     
+    def _extract_keywords_timed(self, query: str) -> Tuple[list, float]:
+        """
+        Extrae las keywords críticas y devuelve también la duración en ms, para registrarla
+        desde el hilo de la petición (el hilo auxiliar no tiene acceso a flask.g).
+        """
+        started = time.perf_counter()
+        critical_keywords = self.openai_service.extraer_keywords_criticas(query) or []
+        return critical_keywords, (time.perf_counter() - started) * 1000
+
     def _perform_semantic_search(self, query: str, k: int) -> list:
         """
         Búsqueda semántica (tu lógica actual)
         """
-        query_processed = self.openai_service.expandir_consulta_con_llm(query)
+        return self._search_faiss(self._embed_query(query), k)
+
+    def _embed_query(self, query: str) -> np.ndarray:
+        """
+        Expande la consulta con el LLM y devuelve su embedding con forma (1, dim).
+        """
+        with span('llm_expand'):
+            query_processed = self.openai_service.expandir_consulta_con_llm(query)
         current_app.logger.info(f"Consulta procesada: {query_processed}")
         
-        embedding = self.openai_service.generate_embedding(query_processed)
+        with span('embedding'):
+            embedding = self.openai_service.generate_embedding(query_processed)
+        return np.array([embedding], dtype=np.float32)
+
+    def _search_faiss(self, query_vector: np.ndarray, k: int) -> list:
         faiss_idx = get_faiss_index()
         
         if faiss_idx is None:
             raise Exception("Índice FAISS no disponible")
         
-        query_vector = np.array([embedding], dtype=np.float32)
-        distances, indices = faiss_idx.search(query_vector, k)
+        with span('faiss'):
+            distances, indices = faiss_idx.search(query_vector, k)
         
-        return self._process_faiss_results(distances, indices)
+        with span('candidates'):
+            return self._process_faiss_results(distances, indices)
+
+    def _perform_lexical_search(self, critical_keywords: List[str], k: int) -> List[Tuple[int, float]]:
+        """
+        Búsqueda léxica de las keywords críticas sobre todo el corpus de candidatos:
+        BM25 en memoria o full-text de PostgreSQL según LEXICAL_SEARCH_BACKEND.
+        """
+        if current_app.config.get('LEXICAL_SEARCH_BACKEND') == 'postgres':
+            lexical_hits = DocumentRepository().search_candidates_fulltext(critical_keywords, k)
+            current_app.logger.info(f"Full-text de PostgreSQL devolvió {len(lexical_hits)} candidatos para las keywords {critical_keywords}")
+            return lexical_hits
+        
+        lexical_idx = get_lexical_index()
+        if lexical_idx is None:
+            return []
+        
+        lexical_hits = lexical_idx.search(critical_keywords, k)
+        current_app.logger.info(f"BM25 devolvió {len(lexical_hits)} candidatos para las keywords {critical_keywords}")
+        return lexical_hits
+
+    def _fuse_with_lexical_results(self, semantic_results: list, lexical_hits: List[Tuple[int, float]], query_vector: np.ndarray) -> list:
+        """
+        Une los resultados semánticos y léxicos y calcula el score de Reciprocal Rank Fusion.
+        Los candidatos que solo encontró BM25 reciben su score semántico a partir del vector
+        guardado en FAISS, para poder re-rankearlos igual que el resto.
+        """
+        results_by_id = {result['document_id']: result for result in semantic_results}
+        
+        lexical_only_ids = [document_id for document_id, _ in lexical_hits if document_id not in results_by_id]
+        for result in self._build_lexical_only_results(lexical_only_ids, query_vector):
+            results_by_id[result['document_id']] = result
+        
+        semantic_ranking = sorted(results_by_id.values(), key=lambda x: x['similarity_percentage'], reverse=True)
+        semantic_ranks = {result['document_id']: rank for rank, result in enumerate(semantic_ranking, 1)}
+        lexical_ranks = {document_id: rank for rank, (document_id, _) in enumerate(lexical_hits, 1)}
+        lexical_scores = dict(lexical_hits)
+        
+        fused_results = []
+        for document_id, result in results_by_id.items():
+            fusion_score = 1 / (self.rrf_k + semantic_ranks[document_id])
+            if document_id in lexical_ranks:
+                fusion_score += 1 / (self.rrf_k + lexical_ranks[document_id])
+            
+            fused_result = result.copy()
+            fused_result['bm25_score'] = round(lexical_scores.get(document_id, 0.0), 4)
+            fused_result['fusion_score'] = round(fusion_score, 6)
+            fused_results.append(fused_result)
+        
+        return fused_results
+
+    def _build_lexical_only_results(self, document_ids: List[int], query_vector: np.ndarray) -> list:
+        if not document_ids:
+            return []
+        
+        similarities = self._score_stored_vectors(document_ids, query_vector)
+        candidates = DocumentRepository().find_candidates_by_document_ids(document_ids)
+        
+        results = []
+        for candidate in candidates:
+            self._search_fields[candidate.document_id] = (candidate.search_text, candidate.search_tokens)
+            
+            results.append({
+                'document_id': candidate.document_id,
+                'filename': candidate.document.filename,
+                'similarity_percentage': similarities.get(candidate.document_id, 0.0),
+                'profile': candidate.to_dict()
+            })
+        return results
+    
+    @staticmethod
+    def _score_stored_vectors(document_ids: List[int], query_vector: np.ndarray) -> Dict[int, float]:
+        """
+        Similitud (misma escala que FAISS: 1 / (1 + distancia L2²) en %) entre la consulta y
+        los vectores guardados de los documentos, calculada para todos con un producto
+        matriz-vector: ||v - q||² = ||v||² - 2·v·q + ||q||². Los documentos sin vector se omiten.
+        """
+        vectors = reconstruct_vectors(document_ids)
+        if not vectors:
+            return {}
+        
+        ids = list(vectors)
+        matrix = np.stack([vectors[document_id] for document_id in ids])
+        query = query_vector[0]
+        distances = np.maximum(np.einsum('ij,ij->i', matrix, matrix) - 2 * (matrix @ query) + query @ query, 0)
+        similarities = np.round(100 / (1 + distances.astype(np.float64)), 2)
+        return dict(zip(ids, similarities.tolist()))
+    
+    def rerank_shortlist(self, query: str, document_ids: List[int]) -> dict:
+        """
+        Ordena una lista explícita de candidatos contra una consulta: un solo embedding de la
+        consulta, los vectores de la lista recuperados en bloque de FAISS y el mismo scoring
+        exacto por keywords que la búsqueda híbrida. No pasa por la búsqueda top-k global.
+        """
+        document_ids = list(dict.fromkeys(int(document_id) for document_id in document_ids))
+        keywords_future = run_concurrently(current_app._get_current_object(), self._extract_keywords_timed, query)
+        
+        query_vector = self._embed_query(query)
+        with span('shortlist_scoring'):
+            similarities = self._score_stored_vectors(document_ids, query_vector)
+        with span('candidates'):
+            candidates = DocumentRepository().find_candidates_by_document_ids(document_ids)
+        
+        results = []
+        for candidate in candidates:
+            self._search_fields[candidate.document_id] = (candidate.search_text, candidate.search_tokens)
+            results.append({
+                'document_id': candidate.document_id,
+                'filename': candidate.document.filename,
+                'similarity_percentage': similarities.get(candidate.document_id, 0.0),
+                'has_embedding': candidate.document_id in similarities,
+                'profile': candidate.to_dict()
+            })
+        
+        critical_keywords, keywords_ms = keywords_future.result()
+        record_timing('llm_keywords', keywords_ms)
+        
+        if critical_keywords:
+            # Término RRF del ranking semántico de la lista; el de keywords lo suma _apply_exact_matching
+            results.sort(key=lambda x: x['similarity_percentage'], reverse=True)
+            for rank, result in enumerate(results, 1):
+                result['fusion_score'] = 1 / (self.rrf_k + rank)
+            with span('rerank'):
+                results = self._apply_exact_matching(results, critical_keywords, len(results))
+        else:
+            results.sort(key=lambda x: x['similarity_percentage'], reverse=True)
+        
+        found_ids = {candidate.document_id for candidate in candidates}
+        return {
+            'results': results,
+            'critical_keywords': critical_keywords,
+            'not_found': [document_id for document_id in document_ids if document_id not in found_ids]
+        }
     
     def _apply_exact_matching(self, semantic_results: list, critical_keywords: List[str], k: int) -> list:
         """
-        Aplica matching exacto y re-rankea los resultados
+        Aplica matching exacto y re-rankea los resultados con Reciprocal Rank Fusion: a la
+        fusión semántica + BM25 (fusion_score) se suma el término RRF de la cobertura de
+        keywords (candidatos ordenados por keywords encontradas). El orden final es el del
+        fusion_score resultante; similarity_percentage conserva el score híbrido legible.
         """
         enhanced_results = []
+        matcher = KeywordMatcher(critical_keywords)
         
         for result in semantic_results:
-            # Obtener texto completo del candidato para búsqueda exacta
-            candidate_text = self._get_candidate_full_text(result)
+            # Texto normalizado y tokens del candidato, precalculados en la ingesta
+            search_text, search_tokens = self._get_candidate_search_fields(result)
             
-            # Contar keywords encontradas
-            found_keywords = self._count_exact_matches(candidate_text, critical_keywords)
+            # Contar keywords encontradas (una sola pasada para todas las keywords)
+            found_keywords = matcher.match(search_text, search_tokens)
             
             # Calcular nuevo score
             semantic_score = result['similarity_percentage']
@@ -112,83 +341,52 @@ class HybridSearchService:
             
             enhanced_results.append(enhanced_result)
         
-        # Re-ordenar por score final y tomar los k mejores
-        enhanced_results.sort(key=lambda x: x['similarity_percentage'], reverse=True)
+        # Ranking por cobertura de keywords (empates comparten posición); sin coincidencias no suma
+        match_counts = sorted((len(result['found_keywords']) for result in enhanced_results), reverse=True)
+        for result in enhanced_results:
+            exact_matches = len(result['found_keywords'])
+            fusion_score = result.get('fusion_score', 0.0)
+            if exact_matches:
+                keyword_rank = 1 + sum(1 for count in match_counts if count > exact_matches)
+                fusion_score += 1 / (self.rrf_k + keyword_rank)
+            result['fusion_score'] = round(fusion_score, 6)
+        
+        # Re-ordenar por la fusión de los tres rankings y tomar los k mejores
+        enhanced_results.sort(key=lambda x: (x['fusion_score'], x['similarity_percentage']), reverse=True)
         return enhanced_results[:k]
     
-    def _get_candidate_full_text(self, result: dict) -> str:
-        """
-        Extrae todo el texto del candidato para búsqueda exacta
-        """
-        profile = result.get('profile', {})
-        
-        # Combinar todos los campos de texto del perfil
-        text_parts = []
-        
-        # Campos principales
-        for field in ['Nombre completo', 'Puesto actual', 'Habilidad principal', 
-                     'Descripción profesional', 'Candidato ideal']:
-            value = profile.get(field, '')
-            if value:
-                text_parts.append(str(value))
-        
-        # Habilidades clave
-        habilidades = profile.get('Habilidades clave', [])
-        if habilidades:
-            text_parts.extend([str(h) for h in habilidades])
-        
-        # Experiencia profesional
-        experiencias = profile.get('Experiencia Profesional', [])
-        for exp in experiencias:
-            for field in ['Puesto', 'Empresa', 'Descripción breve del rol']:
-                value = exp.get(field, '')
-                if value:
-                    text_parts.append(str(value))
-        
-        # Educación
-        educaciones = profile.get('Educación', [])
-        for edu in educaciones:
-            for field in ['Título o carrera', 'Institución', 'Descripción breve']:
-                value = edu.get(field, '')
-                if value:
-                    text_parts.append(str(value))
-        
-        return ' '.join(text_parts).lower()
-    
-    def _count_exact_matches(self, candidate_text: str, keywords: List[str]) -> List[str]:
+    def _get_candidate_search_fields(self, result: dict) -> Tuple[str, list]:
         """
-        Cuenta las keywords que aparecen literalmente en el texto
+        Devuelve el texto normalizado y los tokens del candidato. Si el candidato es anterior
+        a los campos precalculados, se calculan a partir del perfil.
         """
-        found_keywords = []
-        candidate_text_lower = candidate_text.lower()
-        
-        for keyword in keywords:
-            keyword_lower = keyword.lower()
-            
-            # Buscar la keyword como palabra completa (no como substring)
-            if re.search(r'\b' + re.escape(keyword_lower) + r'\b', candidate_text_lower):
-                found_keywords.append(keyword)
-        
-        return found_keywords
+        search_text, search_tokens = self._search_fields.get(result['document_id'], (None, None))
+        if search_text is None:
+            search_text, search_tokens = candidate_search_fields(result.get('profile', {}))
+        return search_text, search_tokens
     
     def _process_faiss_results(self, distances, indices) -> list:
         """
-        Procesa los resultados de FAISS (tu lógica actual)
+        Procesa los resultados de FAISS: carga todos los candidatos en una sola consulta.
         """
+        document_ids = [int(document_id) for document_id in indices[0] if document_id != -1]
+        candidates_by_id = {
+            candidate.document_id: candidate
+            for candidate in DocumentRepository().find_candidates_by_document_ids(document_ids)
+        }
+        
         processed_results = []
-        for i in range(len(indices[0])):
-            if indices[0][i] == -1: 
+        for distance, document_id in zip(distances[0], indices[0]):
+            if document_id == -1: 
                 break
             
-            document_id = int(indices[0][i])
-            candidate = Candidate.query.filter_by(document_id=document_id).first()
-
+            candidate = candidates_by_id.get(int(document_id))
             if not candidate:
-                current_app.logger.warning(f"Doc {document_id} en FAISS sin perfil de candidato. Se omite.")
+                current_app.logger.warning(f"Doc {int(document_id)} en FAISS sin perfil de candidato. Se omite.")
                 continue
 
-            distance = distances[0][i].item()
-            similarity_percentage = round((1 / (1 + distance)) * 100, 2)
+            similarity_percentage = round((1 / (1 + float(distance))) * 100, 2)
+            self._search_fields[candidate.document_id] = (candidate.search_text, candidate.search_tokens)
             
             processed_results.append({
                 'document_id': candidate.document_id,
@@ -197,30 +395,3 @@ class HybridSearchService:
                 'profile': candidate.to_dict()
             })
         return processed_results
-    
-    def _save_results_to_file(self, query: str, results: list, critical_keywords: list) -> str:
-        """
-        Guarda los resultados con información adicional del híbrido
-        """
-        try:
-            resultados_folder = 'resultados'
-            os.makedirs(resultados_folder, exist_ok=True)
-            timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-            filename = f'resultados_hybrid_{timestamp}.json'
-            filepath = os.path.join(resultados_folder, filename)
-            
-            data = {
-                'query': query,
-                'critical_keywords': critical_keywords,
-                'search_type': 'hybrid',
-                'results': results
-            }
-            
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=4, ensure_ascii=False)
-            
-            current_app.logger.info(f"Resultados híbridos guardados en {filepath}")
-            return filename
-        except Exception as e:
-            current_app.logger.error(f"Error al guardar resultados híbridos: {e}")
-            return None
\ No newline at end of file
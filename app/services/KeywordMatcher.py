@@ -0,0 +1,97 @@
+# app/services/KeywordMatcher.py
+"""
+Búsqueda simultánea de varias keywords sobre el texto normalizado de los candidatos.
+
+Las keywords de una sola palabra se resuelven con una consulta al conjunto de tokens
+del candidato; las frases se buscan con un autómata Aho-Corasick construido una vez
+por búsqueda, que recorre el texto en una sola pasada para todas las frases.
+"""
+
+from collections import deque
+
+from app.services.LexicalIndexService import tokenize
+
+
+class KeywordMatcher:
+    """
+    Se construye con las keywords originales de la consulta y se reutiliza para todos
+    los candidatos. match() devuelve las keywords (en su forma original) encontradas
+    como palabra o frase completa.
+    """
+
+    def __init__(self, keywords: list[str]):
+        self.keywords = keywords
+        self._single_terms = {}   # token -> [keywords]
+        self._phrases = {}        # 'frase normalizada' -> [keywords]
+
+        for keyword in keywords:
+            tokens = tokenize(keyword)
+            if not tokens:
+                continue
+            if len(tokens) == 1:
+                self._single_terms.setdefault(tokens[0], []).append(keyword)
+            else:
+                self._phrases.setdefault(' '.join(tokens), []).append(keyword)
+
+        self._goto, self._fail, self._output = self._build_automaton(self._phrases)
+
+    def match(self, search_text: str, search_tokens=None) -> list[str]:
+        """
+        `search_text` debe ser texto normalizado con los tokens separados por un espacio
+        (el formato de Candidate.search_text). `search_tokens` es opcional y evita
+        recalcular el conjunto de tokens.
+        """
+        tokens = set(search_tokens) if search_tokens is not None else set(search_text.split(' '))
+        found = set()
+
+        for term, keywords in self._single_terms.items():
+            if term in tokens:
+                found.update(keywords)
+
+        if self._phrases:
+            for phrase in self._find_phrases(search_text):
+                found.update(self._phrases[phrase])
+
+        return [keyword for keyword in self.keywords if keyword in found]
+
+    def _find_phrases(self, text: str) -> set[str]:
+        found = set()
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for phrase in self._output[state]:
+                start = position - len(phrase) + 1
+                # Solo cuenta si la frase está delimitada por espacios o por los extremos del texto
+                if (start == 0 or text[start - 1] == ' ') and (position + 1 == len(text) or text[position + 1] == ' '):
+                    found.add(phrase)
+        return found
+
+    @staticmethod
+    def _build_automaton(patterns):
+        goto, fail, output = [{}], [0], [[]]
+
+        for pattern in patterns:
+            state = 0
+            for char in pattern:
+                if char not in goto[state]:
+                    goto.append({})
+                    fail.append(0)
+                    output.append([])
+                    goto[state][char] = len(goto) - 1
+                state = goto[state][char]
+            output[state].append(pattern)
+
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0) if goto[fallback].get(char, 0) != next_state else 0
+                output[next_state] = output[next_state] + output[fail[next_state]]
+
+        return goto, fail, output
@@ -0,0 +1,198 @@
+# app/services/LexicalIndexService.py
+"""
+Índice invertido en memoria con ranking BM25 sobre los campos de texto de los candidatos.
+
+Complementa a FAISS: la búsqueda semántica solo devuelve los vecinos más cercanos del
+embedding, mientras que BM25 recorre todo el corpus y encuentra candidatos que contienen
+las keywords aunque su embedding no esté entre los primeros.
+"""
+
+import math
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from flask import current_app
+
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#.]*")
+
+
+def normalize_text(text: str) -> str:
+    """Pasa a minúsculas y elimina tildes y diacríticos."""
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Divide un texto normalizado en términos. Conserva símbolos que forman parte de nombres
+    de tecnologías ('c++', 'c#', 'node.js') y descarta puntos finales de oración.
+    """
+    return [token.rstrip('.') for token in _TOKEN_PATTERN.findall(normalize_text(text)) if token.rstrip('.')]
+
+
+def candidate_profile_text(profile: dict) -> str:
+    """
+    Concatena los campos de texto de un perfil de candidato (formato de Candidate.to_dict()).
+    """
+    text_parts = []
+
+    for field in ['Nombre completo', 'Puesto actual', 'Habilidad principal',
+                  'Descripción profesional', 'Candidato ideal']:
+        value = profile.get(field, '')
+        if value:
+            text_parts.append(str(value))
+
+    text_parts.extend(str(habilidad) for habilidad in profile.get('Habilidades clave') or [])
+
+    for exp in profile.get('Experiencia Profesional') or []:
+        for field in ['Puesto', 'Empresa', 'Descripción breve del rol']:
+            value = exp.get(field, '')
+            if value:
+                text_parts.append(str(value))
+
+    for edu in profile.get('Educación') or []:
+        for field in ['Título o carrera', 'Institución', 'Descripción breve']:
+            value = edu.get(field, '')
+            if value:
+                text_parts.append(str(value))
+
+    return ' '.join(text_parts)
+
+
+def candidate_search_fields(profile: dict) -> tuple[str, list[str]]:
+    """
+    Calcula el texto de búsqueda normalizado (tokens separados por un espacio) y la lista
+    ordenada de tokens únicos de un perfil. Se guarda en Candidate.search_text/search_tokens.
+    """
+    tokens = tokenize(candidate_profile_text(profile))
+    return ' '.join(tokens), sorted(set(tokens))
+
+
+def candidate_search_text(candidate) -> str:
+    """Texto de búsqueda guardado del candidato, o calculado si aún no se generó."""
+    return candidate.search_text or candidate_search_fields(candidate.to_dict())[0]
+
+
+class LexicalIndex:
+    """
+    Índice invertido término -> {document_id: frecuencia} con scoring BM25.
+    Es seguro para uso concurrente: las escrituras y las búsquedas toman el mismo lock.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = defaultdict(dict)
+        self._doc_terms = {}
+        self._doc_lengths = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def add(self, document_id: int, text: str):
+        """Indexa (o reindexa) un documento."""
+        terms = tokenize(text)
+        frequencies = defaultdict(int)
+        for term in terms:
+            frequencies[term] += 1
+
+        with self._lock:
+            self._remove_unlocked(document_id)
+            for term, frequency in frequencies.items():
+                self._postings[term][document_id] = frequency
+            self._doc_terms[document_id] = tuple(frequencies)
+            self._doc_lengths[document_id] = len(terms)
+            self._total_length += len(terms)
+
+    def remove(self, document_id: int):
+        with self._lock:
+            self._remove_unlocked(document_id)
+
+    def remove_many(self, document_ids: list[int]):
+        with self._lock:
+            for document_id in document_ids:
+                self._remove_unlocked(document_id)
+
+    def search(self, query_terms: list[str], k: int) -> list[tuple[int, float]]:
+        """
+        Devuelve los k documentos con mayor score BM25 como [(document_id, score)].
+        Los términos de la consulta se tokenizan igual que los documentos.
+        """
+        terms = {token for term in query_terms for token in tokenize(term)}
+
+        with self._lock:
+            total_docs = len(self._doc_lengths)
+            if not total_docs or not terms:
+                return []
+            avg_length = self._total_length / total_docs
+
+            scores = defaultdict(float)
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for document_id, frequency in postings.items():
+                    length_norm = 1 - self.b + self.b * self._doc_lengths[document_id] / avg_length
+                    scores[document_id] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * length_norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def __len__(self):
+        return len(self._doc_lengths)
+
+    def _remove_unlocked(self, document_id: int):
+        for term in self._doc_terms.pop(document_id, ()):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(document_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(document_id, 0)
+
+
+lexical_index = None
+
+
+def init_lexical_index(app):
+    """
+    Construye el índice léxico a partir de los candidatos existentes en la base de datos.
+    """
+    global lexical_index
+
+    if lexical_index is not None:
+        return lexical_index
+
+    if app.config.get('LEXICAL_SEARCH_BACKEND') == 'postgres':
+        app.logger.info("Búsqueda léxica delegada a PostgreSQL; no se construye el índice en memoria.")
+        return None
+
+    from app.models.Candidate import Candidate
+
+    lexical_index = LexicalIndex()
+    try:
+        for candidate in Candidate.query.all():
+            lexical_index.add(candidate.document_id, candidate_search_text(candidate))
+        app.logger.info(f"Índice léxico construido con {len(lexical_index)} candidatos.")
+    except Exception as e:
+        app.logger.error(f"Error al construir el índice léxico: {e}. Se iniciará vacío.")
+    return lexical_index
+
+
+def get_lexical_index() -> LexicalIndex | None:
+    """Obtiene el índice léxico inicializado."""
+    if lexical_index is None:
+        current_app.logger.warning("Se intentó obtener el índice léxico antes de inicializarlo.")
+    return lexical_index
+
+
+def index_candidate(candidate):
+    """Indexa o reindexa un candidato tras crearlo o editar su perfil."""
+    if lexical_index is not None and candidate is not None:
+        lexical_index.add(candidate.document_id, candidate_search_text(candidate))
+
+
+def remove_documents_from_lexical_index(document_ids: list[int]):
+    if lexical_index is not None and document_ids:
+        lexical_index.remove_many(document_ids)
@@ -3,7 +3,7 @@ import json
 import numpy as np
 from openai import OpenAI
 from flask import current_app
-from app.promts  import REWRITE_PROMPT, STRUCTURE_PROMPT , QUERY_EXPANSION_PROMPT , CRITICAL_KEYWORDS_PROMPT
+from app.promts  import REWRITE_PROMPT, STRUCTURE_PROMPT , QUERY_EXPANSION_PROMPT , CRITICAL_KEYWORDS_PROMPT, BATCH_QUERY_EXPANSION_PROMPT
 
 class OpenAIRewriteService:
     def __init__(self):
@@ -56,6 +56,19 @@ class OpenAIRewriteService:
             current_app.logger.error(f"Error al generar embedding: {str(e)}")
             raise
 
+    def generate_embeddings(self, texts: list[str]) -> list[list]:
+        """Genera los embeddings de varios textos en una sola llamada, en el mismo orden."""
+        try:
+            embedding_model_to_use = current_app.config.get('OPENAI_EMBEDDING_MODEL', 'text-embedding-3-large')
+            response = self.client.embeddings.create(
+                model=embedding_model_to_use,
+                input=texts
+            )
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        except Exception as e:
+            current_app.logger.error(f"Error al generar {len(texts)} embeddings: {str(e)}")
+            raise
+
     def structure_profile(self, text: str, ai_plus_enabled: bool = False) -> dict:
         """Convierte un texto reescrito en un JSON estructurado con la información del perfil."""
         try:
@@ -106,6 +119,31 @@ class OpenAIRewriteService:
             current_app.logger.error(f"Error al expandir la consulta con OpenAI: {str(e)}. Devolviendo la consulta original.")
             return query
 
+    def expandir_consultas_con_llm(self, queries: list[str]) -> list[str] | None:
+        """
+        Expande varias consultas en una sola llamada al LLM. Si la llamada falla o la
+        respuesta no trae un perfil por consulta, devuelve None.
+        """
+        try:
+            numbered_queries = "\n".join(f"{i}. {query}" for i, query in enumerate(queries, 1))
+            response = self.client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": "Eres un asistente experto en optimización de búsquedas para reclutamiento TI."},
+                    {"role": "user", "content": BATCH_QUERY_EXPANSION_PROMPT + numbered_queries}
+                ],
+                max_tokens=200 * len(queries),
+                temperature=0.4,
+                response_format={"type": "json_object"}
+            )
+            profiles = json.loads(response.choices[0].message.content).get("perfiles", [])
+            if len(profiles) != len(queries):
+                raise ValueError(f"se esperaban {len(queries)} perfiles y se recibieron {len(profiles)}")
+            return [str(profile).strip() or query for profile, query in zip(profiles, queries)]
+        except Exception as e:
+            current_app.logger.error(f"Error al expandir {len(queries)} consultas con OpenAI: {str(e)}.")
+            return None
+
     def extraer_keywords_criticas(self, query: str) -> list:
         """Extrae keywords críticas de una consulta usando LLM."""
         try:
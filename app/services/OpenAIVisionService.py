@@ -2,14 +2,15 @@
 
 import os
 import base64
-import fitz # PyMuPDF
-from PIL import Image, ImageEnhance
-import io
 import re
+import math
+from concurrent.futures import ThreadPoolExecutor, wait
 from openai import OpenAI
 from flask import current_app
 import traceback
 
+from app.services.PdfProcessingPool import count_pdf_pages, iter_rendered_pages_in_pool
+
 class OpenAIVisionService:
     def __init__(self):
         self.api_key = os.getenv('OPENAI_API_KEY')
@@ -21,34 +22,38 @@ class OpenAIVisionService:
         self.model = "gpt-4o"
         self.max_tokens = 4096
         
-        self.MAX_PAGES = 3
-        self.DPI_SCALE = 2.0
+        self.MAX_PAGES = current_app.config.get('VISION_MAX_PAGES', 3)
+        self.DPI_SCALE = 2.0  # Escala máxima de renderizado
+        self.MIN_DPI_SCALE = 0.75
         self.MAX_IMAGE_SIZE = 2048
+        # En modo "high" GPT-4o reescala la imagen para que su lado corto mida 768px;
+        # renderizar por encima de eso solo agrega bytes que la API descarta.
+        self.TARGET_SHORT_SIDE = 768
+        self.IMAGE_QUALITY_STEPS = (85, 75, 65, 50)
         self.QUALITY_THRESHOLD = 100
 
+        self.image_format = current_app.config.get('VISION_IMAGE_FORMAT', 'JPEG').upper()
+        self.max_image_bytes = current_app.config.get('VISION_MAX_IMAGE_BYTES', 512 * 1024)
+
+        self.max_workers = max(1, current_app.config.get('VISION_MAX_WORKERS', 3))
+        self.page_timeout = current_app.config.get('VISION_PAGE_TIMEOUT', 60)
+
     def extract_text_from_pdf_with_vision(self, pdf_path, max_pages=None):
         max_pages = max_pages or self.MAX_PAGES
         current_app.logger.info(f"Iniciando extracción con Vision de: {pdf_path}")
         
         try:
-            images = self._convert_pdf_to_images_robust(pdf_path, max_pages)
-            if not images:
-                raise ValueError("No se pudieron generar imágenes del PDF")
-
-            current_app.logger.debug(f"PDF convertido a {len(images)} imágenes exitosamente")
+            page_texts = self._process_pages_concurrently(pdf_path, max_pages)
 
+            # Reensamblar en orden de página, sin importar el orden en que respondió la API
             extracted_pages = []
-            for i, img_data in enumerate(images):
-                try:
-                    page_text = self._process_image_with_vision(img_data, i + 1)
-                    if page_text and len(page_text.strip()) > self.QUALITY_THRESHOLD:
-                        extracted_pages.append(page_text)
-                        current_app.logger.debug(f"Página {i+1} procesada: {len(page_text)} caracteres")
-                    else:
-                        current_app.logger.warning(f"Página {i+1} produjo texto insuficiente o nulo")
-                except Exception as e:
-                    current_app.logger.error(f"Error procesando página {i+1}: {str(e)}")
-                    continue
+            for page_number in sorted(page_texts):
+                page_text = page_texts[page_number]
+                if page_text and len(page_text.strip()) > self.QUALITY_THRESHOLD:
+                    extracted_pages.append(page_text)
+                    current_app.logger.debug(f"Página {page_number} procesada: {len(page_text)} caracteres")
+                else:
+                    current_app.logger.warning(f"Página {page_number} produjo texto insuficiente o nulo")
 
             if not extracted_pages:
                 raise ValueError("No se pudo extraer texto de ninguna página")
@@ -63,71 +68,112 @@ class OpenAIVisionService:
             current_app.logger.error(traceback.format_exc())
             raise
 
-    def _convert_pdf_to_images_robust(self, pdf_path, max_pages):
+    def extract_text_from_pages(self, pdf_path, page_numbers):
+        """
+        Procesa con Vision solo las páginas indicadas (numeradas desde 1).
+        Devuelve {número de página: texto} con las páginas que produjeron texto.
+        """
+        current_app.logger.info(f"Extrayendo con Vision las páginas {page_numbers} de: {pdf_path}")
+        page_texts = self._process_pages_concurrently(pdf_path, page_numbers=page_numbers)
+        return {page_number: text.strip() for page_number, text in page_texts.items() if text and text.strip()}
+
+    def _process_pages_concurrently(self, pdf_path, max_pages=None, page_numbers=None):
+        """
+        Renderiza las páginas y las envía a la API de Vision con un pool de hilos acotado.
+        El renderizado ocurre en el hilo actual (MuPDF no es thread-safe), pero cada página
+        se envía al pool apenas está lista, solapándose con las llamadas ya en curso.
+        Devuelve un diccionario {número de página: texto} solo con las páginas que respondieron.
+        """
+        app = current_app._get_current_object()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="vision-page")
+        futures = {}
+        page_texts = {}
+        try:
+            for page_number, image_bytes, mime_type in self._iter_pdf_page_images(pdf_path, max_pages, page_numbers):
+                futures[executor.submit(self._process_page_in_app_context, app, image_bytes, page_number, mime_type)] = page_number
+
+            if not futures:
+                raise ValueError("No se pudieron generar imágenes del PDF")
+
+            current_app.logger.debug(f"PDF convertido a {len(futures)} imágenes, procesando con hasta {self.max_workers} llamadas concurrentes")
+
+            # Cada llamada ya tiene su propio timeout; este límite global cubre las páginas que esperan turno en el pool
+            rounds = math.ceil(len(futures) / self.max_workers)
+            done, not_done = wait(futures, timeout=self.page_timeout * rounds)
+
+            for future in not_done:
+                current_app.logger.error(f"Timeout procesando página {futures[future]} con Vision ({self.page_timeout}s)")
+                future.cancel()
+
+            for future in done:
+                page_number = futures[future]
+                try:
+                    page_texts[page_number] = future.result()
+                except Exception as e:
+                    current_app.logger.error(f"Error procesando página {page_number}: {str(e)}")
+
+            return page_texts
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _process_page_in_app_context(self, app, image_bytes, page_number, mime_type):
+        with app.app_context():
+            return self._process_image_with_vision(image_bytes, page_number, mime_type)
+
+    def _iter_pdf_page_images(self, pdf_path, max_pages=None, page_numbers=None):
+        """
+        Genera (número de página, bytes de imagen, mime type) a medida que cada página se renderiza,
+        para que el llamador pueda despachar la página sin esperar al resto del documento.
+        Si se indican page_numbers (desde 1) se renderizan solo esas; si no, las primeras max_pages.
+        Con el pool de procesos habilitado cada página se renderiza en paralelo en otro proceso.
+        """
         current_app.logger.debug(f"Convirtiendo PDF a imágenes: {pdf_path}")
         try:
-            doc = fitz.open(pdf_path)
-            total_pages = doc.page_count
-            pages_to_process = min(total_pages, max_pages)
-            current_app.logger.debug(f"Documento tiene {total_pages} páginas, procesando {pages_to_process}")
+            total_pages = count_pdf_pages(pdf_path)
             if total_pages == 0: raise ValueError("El PDF no tiene páginas válidas")
-            images = []
+            if page_numbers is None:
+                page_numbers = list(range(1, min(total_pages, max_pages or self.MAX_PAGES) + 1))
+            current_app.logger.debug(f"Documento tiene {total_pages} páginas, procesando {len(page_numbers)}")
+
             successful_pages = 0
-            for page_num in range(pages_to_process):
-                try:
-                    page = doc.load_page(page_num)
-                    if page.rect.is_empty: continue
-                    matrix = fitz.Matrix(self.DPI_SCALE, self.DPI_SCALE)
-                    pix = page.get_pixmap(matrix=matrix, alpha=False)
-                    img_data = pix.tobytes("png")
-                    pil_image = Image.open(io.BytesIO(img_data))
-                    optimized_image = self._optimize_image_for_ocr(pil_image)
-                    img_buffer = io.BytesIO()
-                    optimized_image.save(img_buffer, format='PNG', optimize=True)
-                    img_buffer.seek(0)
-                    images.append(img_buffer)
-                    successful_pages += 1
-                    current_app.logger.debug(f"Página {page_num + 1} convertida exitosamente: {optimized_image.size}")
-                except Exception as e:
-                    current_app.logger.error(f"Error convirtiendo página {page_num + 1}: {str(e)}")
+            for rendered in iter_rendered_pages_in_pool(pdf_path, self._render_options(), page_numbers):
+                if 'error' in rendered:
+                    current_app.logger.error(f"Error convirtiendo página {rendered['page_number']}: {rendered['error']}")
                     continue
-            doc.close()
+                successful_pages += 1
+                current_app.logger.debug(f"Página {rendered['page_number']} convertida exitosamente: {rendered['size']} (escala {rendered['scale']:.2f}, {len(rendered['image_bytes'])} bytes {rendered['mime_type']})")
+                yield rendered['page_number'], rendered['image_bytes'], rendered['mime_type']
+
             if successful_pages == 0: raise ValueError("No se pudo convertir ninguna página del PDF")
             current_app.logger.debug(f"Conversión completada: {successful_pages} páginas exitosas")
-            return images
         except Exception as e:
             current_app.logger.error(f"Error en conversión de PDF: {str(e)}")
             raise
 
-    def _optimize_image_for_ocr(self, pil_image):
-        try:
-            if pil_image.mode != 'RGB': pil_image = pil_image.convert('RGB')
-            width, height = pil_image.size
-            if width > self.MAX_IMAGE_SIZE or height > self.MAX_IMAGE_SIZE:
-                ratio = min(self.MAX_IMAGE_SIZE / width, self.MAX_IMAGE_SIZE / height)
-                new_size = (int(width * ratio), int(height * ratio))
-                pil_image = pil_image.resize(new_size, Image.LANCZOS)
-            enhancer = ImageEnhance.Contrast(pil_image)
-            pil_image = enhancer.enhance(1.2)
-            return pil_image
-        except Exception as e:
-            current_app.logger.warning(f"Error optimizando imagen: {str(e)}")
-            return pil_image
-
-    def _process_image_with_vision(self, img_buffer, page_number):
-        # ... este método ya estaba bien, no se necesita cambiar ...
+    def _render_options(self):
+        return {
+            'max_scale': self.DPI_SCALE,
+            'min_scale': self.MIN_DPI_SCALE,
+            'max_image_size': self.MAX_IMAGE_SIZE,
+            'target_short_side': self.TARGET_SHORT_SIDE,
+            'image_format': self.image_format,
+            'quality_steps': self.IMAGE_QUALITY_STEPS,
+            'max_image_bytes': self.max_image_bytes,
+        }
+
+    def _process_image_with_vision(self, image_bytes, page_number, mime_type="image/jpeg"):
         try:
-            img_buffer.seek(0)
-            base64_image = base64.b64encode(img_buffer.read()).decode('utf-8')
+            base64_image = base64.b64encode(image_bytes).decode('utf-8')
             messages = [
                 {"role": "system", "content": self._get_vision_system_prompt()},
                 {"role": "user", "content": [
                     {"type": "text", "text": f"Extrae y estructura toda la información de esta página de CV (página {page_number}). Usa el formato exacto especificado. Si no hay información para alguna sección, déjala vacía pero mantén la estructura."},
-                    {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{base64_image}", "detail": "high"}}
+                    {"type": "image_url", "image_url": {"url": f"data:{mime_type};base64,{base64_image}", "detail": "high"}}
                 ]}
             ]
             response = self.client.chat.completions.create(
-                model=self.model, messages=messages, max_tokens=self.max_tokens, temperature=0.1, top_p=0.9
+                model=self.model, messages=messages, max_tokens=self.max_tokens, temperature=0.1, top_p=0.9,
+                timeout=self.page_timeout
             )
             extracted_text = response.choices[0].message.content
             if not extracted_text:
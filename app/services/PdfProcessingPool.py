@@ -0,0 +1,194 @@
+# app/services/PdfProcessingPool.py
+"""
+Trabajo CPU-bound sobre PDFs (extracción con PyPDF2, rasterizado con PyMuPDF y
+compresión con PIL) ejecutable en un pool de procesos.
+
+Las funciones de tarea de este módulo no usan el contexto de Flask: reciben todo
+por parámetro y devuelven solo resultados compactos (texto y bytes ya codificados),
+de modo que pueden correr en otro proceso sin retener el GIL del proceso web.
+Si PDF_PROCESS_POOL_WORKERS es 0 se ejecutan en línea, en el hilo que las llama.
+"""
+
+import io
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import fitz  # PyMuPDF
+import PyPDF2
+from PIL import Image, ImageEnhance
+from flask import current_app
+
+
+# ────────────────────── Tareas (sin contexto de Flask) ──────────────────────
+
+def extract_pdf_pages_text(file_path: str) -> tuple[list[str], list[tuple[int, str]]]:
+    """
+    Extrae el texto de cada página con PyPDF2.
+    Devuelve (textos por página, [(número de página, error)]) y lanza excepción si el PDF es inválido.
+    """
+    page_texts, page_errors = [], []
+    with open(file_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        for page_number, page in enumerate(reader.pages, 1):
+            try:
+                page_texts.append((page.extract_text() or '').strip())
+            except Exception as e:
+                page_errors.append((page_number, str(e)))
+                page_texts.append('')
+    return page_texts, page_errors
+
+
+def count_pdf_pages(pdf_path: str) -> int:
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+def iter_rendered_pages(pdf_path: str, options: dict, page_numbers: list[int]):
+    """
+    Renderiza y codifica las páginas indicadas (desde 1) abriendo el documento una sola vez.
+    Genera un dict por página: con 'image_bytes' si se convirtió o con 'error' si falló.
+    """
+    with fitz.open(pdf_path) as doc:
+        for page_number in page_numbers:
+            if not 0 < page_number <= doc.page_count:
+                continue
+            try:
+                page = doc.load_page(page_number - 1)
+                if page.rect.is_empty:
+                    continue
+                scale = adaptive_scale(page.rect, options)
+                pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), colorspace=fitz.csRGB, alpha=False)
+                # PIL lee directamente las muestras del pixmap, sin pasar por un PNG intermedio
+                pil_image = Image.frombuffer("RGB", (pix.width, pix.height), pix.samples_mv, "raw", "RGB", pix.stride, 1)
+                optimized_image = optimize_image_for_ocr(pil_image, options['max_image_size'])
+                image_bytes, mime_type = encode_image(optimized_image, options)
+                yield {
+                    'page_number': page_number, 'image_bytes': image_bytes, 'mime_type': mime_type,
+                    'size': optimized_image.size, 'scale': scale,
+                }
+            except Exception as e:
+                yield {'page_number': page_number, 'error': str(e)}
+
+
+def render_pdf_pages(pdf_path: str, options: dict, page_numbers: list[int]) -> list[dict]:
+    return list(iter_rendered_pages(pdf_path, options, page_numbers))
+
+
+def adaptive_scale(page_rect, options: dict) -> float:
+    """
+    Elige la escala de renderizado según el tamaño de la página: el lado corto apunta a
+    target_short_side y el lado largo nunca supera max_image_size.
+    """
+    short_side = min(page_rect.width, page_rect.height)
+    long_side = max(page_rect.width, page_rect.height)
+    if short_side <= 0:
+        return options['max_scale']
+    scale = min(options['target_short_side'] / short_side, options['max_image_size'] / long_side)
+    return max(options['min_scale'], min(options['max_scale'], scale))
+
+
+def optimize_image_for_ocr(pil_image, max_image_size: int):
+    if pil_image.mode != 'RGB': pil_image = pil_image.convert('RGB')
+    width, height = pil_image.size
+    if width > max_image_size or height > max_image_size:
+        ratio = min(max_image_size / width, max_image_size / height)
+        new_size = (int(width * ratio), int(height * ratio))
+        pil_image = pil_image.resize(new_size, Image.LANCZOS)
+    return ImageEnhance.Contrast(pil_image).enhance(1.2)
+
+
+def encode_image(pil_image, options: dict) -> tuple[bytes, str]:
+    """
+    Comprime la imagen en JPEG o WebP bajando la calidad hasta entrar en max_image_bytes.
+    Si ninguna calidad entra en el presupuesto se usa la última (la más liviana).
+    """
+    image_format = options['image_format'] if options['image_format'] in ('JPEG', 'WEBP') else 'JPEG'
+    mime_type = f"image/{image_format.lower()}"
+    image_bytes = b""
+    for quality in options['quality_steps']:
+        img_buffer = io.BytesIO()
+        pil_image.save(img_buffer, format=image_format, quality=quality)
+        image_bytes = img_buffer.getvalue()
+        if len(image_bytes) <= options['max_image_bytes']:
+            break
+    return image_bytes, mime_type
+
+
+# ────────────────────── Pool de procesos ──────────────────────
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pdf_process_pool() -> ProcessPoolExecutor | None:
+    """
+    Devuelve el pool de procesos, creándolo en el primer uso.
+    Devuelve None si PDF_PROCESS_POOL_WORKERS es 0 (ejecución en línea).
+    """
+    global _pool
+    workers = current_app.config.get('PDF_PROCESS_POOL_WORKERS', 0)
+    if workers <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # 'spawn' evita heredar por fork los hilos y conexiones del proceso web
+                _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+                current_app.logger.info(f"Pool de procesos para PDFs creado con {workers} workers.")
+    return _pool
+
+
+def reset_pdf_process_pool():
+    """Descarta un pool roto para que el próximo uso cree uno nuevo."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def run_pdf_task(func, *args):
+    """
+    Ejecuta una tarea de este módulo en el pool de procesos (si está habilitado) y espera su resultado.
+    Si el pool se rompe (por ejemplo, un worker murió) o no responde dentro de
+    PDF_PROCESS_POOL_TIMEOUT, se descarta y la tarea se reintenta en línea.
+    """
+    pool = get_pdf_process_pool()
+    if pool is None:
+        return func(*args)
+    try:
+        return pool.submit(func, *args).result(timeout=current_app.config.get('PDF_PROCESS_POOL_TIMEOUT', 120))
+    except (BrokenProcessPool, FuturesTimeoutError) as e:
+        current_app.logger.error(f"El pool de procesos para PDFs falló ejecutando '{func.__name__}' ({type(e).__name__}). Se reintenta en línea.")
+        reset_pdf_process_pool()
+        return func(*args)
+
+
+def iter_rendered_pages_in_pool(pdf_path: str, options: dict, page_numbers: list[int]):
+    """
+    Como iter_rendered_pages, pero con cada página renderizada en paralelo en el pool de
+    procesos (si está habilitado); las páginas se generan a medida que terminan.
+    Si el pool se rompe o no termina dentro de PDF_PROCESS_POOL_TIMEOUT, se descarta y
+    las páginas que faltan se renderizan en línea.
+    """
+    pool = get_pdf_process_pool()
+    if pool is None:
+        yield from iter_rendered_pages(pdf_path, options, page_numbers)
+        return
+
+    remaining = list(page_numbers)
+    try:
+        futures = {pool.submit(render_pdf_pages, pdf_path, options, [page_number]): page_number for page_number in page_numbers}
+        for future in as_completed(futures, timeout=current_app.config.get('PDF_PROCESS_POOL_TIMEOUT', 120)):
+            rendered_pages = future.result()
+            remaining.remove(futures[future])
+            yield from rendered_pages
+    except (BrokenProcessPool, FuturesTimeoutError) as e:
+        current_app.logger.error(
+            f"El pool de procesos para PDFs falló renderizando '{pdf_path}' ({type(e).__name__}). "
+            f"Se renderizan en línea las páginas {remaining}."
+        )
+        reset_pdf_process_pool()
+        yield from iter_rendered_pages(pdf_path, options, remaining)
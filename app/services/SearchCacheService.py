@@ -0,0 +1,48 @@
+# app/services/SearchCacheService.py
+"""
+Caché de resultados de /api/search.
+
+La clave incluye la consulta normalizada, el modo de búsqueda, k, los filtros y la
+versión del índice. Cualquier alta, edición o baja de candidatos incrementa la versión
+(ver extensions.bump_index_version), así que nunca se sirve un resultado obsoleto: las
+entradas viejas simplemente dejan de ser alcanzables y salen por LRU o por TTL.
+"""
+
+import json
+from flask import current_app
+
+from app.cache import TTLCache
+from app.extensions import get_index_version
+from app.services.LexicalIndexService import normalize_text
+
+_search_result_cache = TTLCache(max_entries=512)
+
+
+def normalize_query(query: str) -> str:
+    """Minúsculas, sin tildes y con los espacios colapsados."""
+    return ' '.join(normalize_text(query).split())
+
+
+def search_cache_key(query: str, mode: str, k: int, filters: dict | None = None) -> tuple:
+    return (normalize_query(query), mode, k, json.dumps(filters or {}, sort_keys=True), get_index_version())
+
+
+def get_cached_search(cache_key: tuple) -> dict | None:
+    """Devuelve una copia del resultado cacheado, marcada con 'cached': True, o None."""
+    if current_app.config.get('SEARCH_CACHE_TTL_SECONDS', 0) <= 0:
+        return None
+    cached = _search_result_cache.get(cache_key)
+    if cached is None:
+        return None
+    current_app.logger.info(f"Resultado de búsqueda servido desde caché para '{cache_key[0]}' (modo: {cache_key[1]}).")
+    return dict(cached, cached=True)
+
+
+def cache_search_result(cache_key: tuple, result: dict):
+    ttl = current_app.config.get('SEARCH_CACHE_TTL_SECONDS', 0)
+    if ttl > 0:
+        _search_result_cache.set(cache_key, result, ttl=ttl)
+
+
+def get_search_cache_stats() -> dict:
+    return _search_result_cache.stats()
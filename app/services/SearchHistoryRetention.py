@@ -0,0 +1,209 @@
+# app/services/SearchHistoryRetention.py
+
+import os
+import gzip
+import time
+import shutil
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import null
+
+from app.background import PeriodicTask
+from app.models.Result import SearchResult
+from app.repositories.SearchResultRepository import SearchResultRepository
+
+
+class SearchHistoryRetention:
+    """
+    Mantiene acotados el historial de búsquedas y la carpeta de resultados:
+    - elimina las entradas que no se ejecutan hace más de `retention_days`, junto con su archivo;
+    - compacta las que no se ejecutan hace más de `compact_after_days`: comprime su archivo a
+      .json.gz y pasa los resultados completos de result_json a la copia comprimida (snapshot);
+    - elimina los archivos de resultados sin entrada en el historial más viejos que la retención.
+    Cada ejecución procesa como máximo `batch_size` entradas por paso.
+    """
+
+    def __init__(self, results_folder: str, retention_days: int, compact_after_days: int, batch_size: int):
+        self.results_folder = results_folder
+        self.retention_days = retention_days
+        self.compact_after_days = compact_after_days
+        self.batch_size = batch_size
+        self.repository = SearchResultRepository()
+        self._lock = threading.Lock()
+        self._counters = {
+            'runs': 0,
+            'deleted_entries': 0,
+            'compacted_entries': 0,
+            'compressed_files': 0,
+            'orphan_files': 0,
+            'errors': 0,
+            'last_run_at': None,
+            'last_run_duration_ms': None,
+        }
+
+    def run(self) -> dict:
+        started = time.monotonic()
+        now = datetime.utcnow()
+        errors = 0
+
+        deleted_entries, delete_errors = self._delete_expired(now - timedelta(days=self.retention_days))
+        compacted_entries, compressed_files, compact_errors = self._compact(now - timedelta(days=self.compact_after_days))
+        orphan_files, orphan_errors = self._delete_orphan_files(time.time() - self.retention_days * 86400)
+        errors += delete_errors + compact_errors + orphan_errors
+
+        with self._lock:
+            self._counters['runs'] += 1
+            self._counters['deleted_entries'] += deleted_entries
+            self._counters['compacted_entries'] += compacted_entries
+            self._counters['compressed_files'] += compressed_files
+            self._counters['orphan_files'] += orphan_files
+            self._counters['errors'] += errors
+            self._counters['last_run_at'] = now.isoformat()
+            self._counters['last_run_duration_ms'] = round((time.monotonic() - started) * 1000, 2)
+
+        if deleted_entries or compacted_entries or orphan_files:
+            current_app.logger.info(
+                f"[INFO] Retención del historial: {deleted_entries} entradas eliminadas, {compacted_entries} compactadas "
+                f"({compressed_files} archivos comprimidos), {orphan_files} archivos huérfanos eliminados."
+            )
+        return self.get_stats()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+        stats.update({
+            'retention_days': self.retention_days,
+            'compact_after_days': self.compact_after_days,
+        })
+        return stats
+
+    def _delete_expired(self, cutoff: datetime) -> tuple[int, int]:
+        expired = self.repository.find_expired(cutoff, self.batch_size)
+        if not expired:
+            return 0, 0
+
+        errors = 0
+        try:
+            deleted = self.repository.delete_by_ids([row.id for row in expired])
+        except Exception as e:
+            current_app.logger.error(f"[ERROR] No se pudieron eliminar las entradas vencidas del historial: {e}")
+            return 0, 1
+
+        for row in expired:
+            if row.saved_file and not self._remove_file(row.saved_file):
+                errors += 1
+        return deleted, errors
+
+    def _compact(self, cutoff: datetime) -> tuple[int, int, int]:
+        entries = self.repository.find_compactable(cutoff, self.batch_size)
+        if not entries:
+            return 0, 0, 0
+
+        compressed_files = errors = 0
+        replaced_files = []
+        for entry in entries:
+            if entry.result_json is not None:
+                entry.snapshot = SearchResult.compress_results(entry.result_json)
+                entry.result_json = null()
+            if entry.saved_file and entry.saved_file.endswith('.json'):
+                if not os.path.exists(os.path.join(self.results_folder, entry.saved_file)):
+                    # Sin archivo que comprimir: se desvincula para que la entrada salga de los candidatos
+                    current_app.logger.warning(f"[ADVERTENCIA] El archivo de resultados '{entry.saved_file}' no existe. Se desvincula de la entrada {entry.id}.")
+                    entry.saved_file = None
+                    continue
+                compressed_file = self._compress_file(entry.saved_file)
+                if compressed_file:
+                    replaced_files.append(entry.saved_file)
+                    entry.saved_file = compressed_file
+                    compressed_files += 1
+                else:
+                    errors += 1
+
+        try:
+            self.repository.save_all()
+        except Exception as e:
+            current_app.logger.error(f"[ERROR] No se pudo compactar el historial de búsquedas: {e}")
+            return 0, 0, errors + 1
+
+        # Los originales se eliminan solo después de que el historial apunta a los comprimidos
+        for saved_file in replaced_files:
+            if not self._remove_file(saved_file):
+                errors += 1
+        return len(entries), compressed_files, errors
+
+    def _delete_orphan_files(self, cutoff_mtime: float) -> tuple[int, int]:
+        candidates = []
+        try:
+            with os.scandir(self.results_folder) as iterator:
+                for entry in iterator:
+                    try:
+                        if entry.is_file(follow_symlinks=False) and entry.stat(follow_symlinks=False).st_mtime < cutoff_mtime:
+                            candidates.append(entry.name)
+                    except FileNotFoundError:
+                        continue
+        except FileNotFoundError:
+            return 0, 0
+        if not candidates:
+            return 0, 0
+
+        referenced = self.repository.find_all_saved_files()
+        removed = errors = 0
+        for name in candidates:
+            if name in referenced:
+                continue
+            if self._remove_file(name):
+                removed += 1
+            else:
+                errors += 1
+        return removed, errors
+
+    def _compress_file(self, saved_file: str) -> str | None:
+        source = os.path.join(self.results_folder, saved_file)
+        compressed_file = f"{saved_file}.gz"
+        try:
+            with open(source, 'rb') as f_in, gzip.open(os.path.join(self.results_folder, compressed_file), 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            return compressed_file
+        except OSError as e:
+            current_app.logger.error(f"[ERROR] No se pudo comprimir el archivo de resultados '{saved_file}': {e}")
+            return None
+
+    def _remove_file(self, saved_file: str) -> bool:
+        try:
+            filepath = os.path.join(self.results_folder, saved_file)
+            if os.path.exists(filepath):
+                os.remove(filepath)
+            return True
+        except OSError as e:
+            current_app.logger.error(f"[ERROR] No se pudo eliminar el archivo de resultados '{saved_file}': {e}")
+            return False
+
+
+_retention = None
+_retention_task = None
+
+
+def init_search_history_retention(app):
+    """
+    Crea el proceso de retención del historial y lanza su tarea periódica.
+    """
+    global _retention, _retention_task
+
+    if _retention is not None:
+        return _retention
+
+    _retention = SearchHistoryRetention(
+        results_folder=app.config.get('RESULTADOS_FOLDER', 'resultados'),
+        retention_days=app.config['SEARCH_HISTORY_RETENTION_DAYS'],
+        compact_after_days=app.config['SEARCH_HISTORY_COMPACT_AFTER_DAYS'],
+        batch_size=app.config['SEARCH_HISTORY_RETENTION_BATCH_SIZE'],
+    )
+    _retention_task = PeriodicTask(app, 'search-history-retention', app.config['SEARCH_HISTORY_RETENTION_INTERVAL_SECONDS'], _retention.run)
+    _retention_task.start()
+    return _retention
+
+
+def get_search_history_retention():
+    """Obtiene el proceso de retención del historial inicializado."""
+    return _retention
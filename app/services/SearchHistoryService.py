@@ -1,9 +1,14 @@
 # app/services/SearchHistoryService.py
 
 import os
+import base64
 import logging
+from datetime import datetime
 from app.repositories.SearchResultRepository import SearchResultRepository
+from app.repositories.DocumentRepository import DocumentRepository
 from app.models.Result import SearchResult
+from app.services.SearchPersistenceWriter import get_search_persistence_writer, persist_search_batch
+from app.services.SearchCacheService import normalize_query
 from flask import current_app
 
 # Es una buena práctica obtener un logger específico para el módulo
@@ -12,6 +17,7 @@ logger = logging.getLogger(__name__)
 class SearchHistoryService:
     def __init__(self):
         self.repository = SearchResultRepository()
+        self.document_repository = DocumentRepository()
 
     def save_search_result(self, query: str, results: dict, filename: str = None) -> SearchResult:
         if not query: raise ValueError("El texto de búsqueda no puede estar vacío")
@@ -19,6 +25,152 @@ class SearchHistoryService:
         search_result = SearchResult(query=query, result_json=results, saved_file=filename)
         return self.repository.create(search_result)
 
+    def record_search(self, query: str, results: list, search_type: str, extra_file_data: dict | None = None) -> int | None:
+        """
+        Registra una búsqueda en el historial y en su archivo de resultados.
+        Si la misma consulta (normalizada) ya existe para el modo, guardada o pendiente en la
+        cola del escritor, se reutiliza su entrada y se incrementa hit_count; si no, se reserva
+        un ID nuevo. La escritura la hace el escritor en segundo plano (o se hace en línea si
+        no está activo), así que el ID puede no existir todavía en la base de datos.
+        Devuelve el ID o None si no se pudo obtener.
+        """
+        if not query: raise ValueError("El texto de búsqueda no puede estar vacío")
+
+        query_normalized = normalize_query(query)
+        writer = get_search_persistence_writer()
+        try:
+            # Si dos procesos reservan IDs distintos para la misma consulta, el escritor agrupa
+            # la segunda en la entrada de la primera (la restricción única impide duplicarla).
+            existing_id = writer.pending_id_for(query_normalized, search_type) if writer is not None else None
+            if existing_id is None:
+                existing_id = self.repository.find_id_by_normalized_query(query_normalized, search_type)
+            search_result_id = existing_id or self.repository.reserve_id()
+        except Exception as e:
+            logger.error(f"No se pudo obtener un ID para el historial de la búsqueda '{query}': {e}")
+            return None
+
+        created_at = datetime.utcnow()
+        store_mode = current_app.config.get('SEARCH_HISTORY_STORE_MODE', 'ids')
+        file_results = results if store_mode == 'full' else self._compact_results(results)
+        job = {
+            'search_result_id': search_result_id,
+            'existing': existing_id is not None,
+            'query': query,
+            'query_normalized': query_normalized,
+            'search_type': search_type,
+            'results': results,
+            'store_mode': store_mode,
+            'snapshot': current_app.config.get('SEARCH_HISTORY_SNAPSHOTS', False),
+            'saved_file': f"resultados_{search_type}_{created_at.strftime('%Y-%m-%d_%H-%M-%S')}_{search_result_id}.json",
+            'file_payload': {'query': query, **(extra_file_data or {}), 'search_type': search_type, 'results': file_results},
+            'created_at': created_at,
+        }
+
+        self._submit(job)
+        return search_result_id
+
+    def record_cache_hit(self, query: str, response: dict, search_type: str, extra_file_data: dict | None = None) -> int | None:
+        """
+        Registra en el historial una búsqueda resuelta con la caché exacta: suma un hit y
+        actualiza last_run_at de la entrada de la respuesta cacheada, sin reescribir sus
+        resultados. Si la respuesta no tiene entrada (falló su registro), se registra completa.
+        Devuelve el ID de la entrada.
+        """
+        search_result_id = response.get('search_result_id')
+        if search_result_id is None:
+            return self.record_search(query, response.get('results', []), search_type, extra_file_data)
+
+        self._submit({'touch': True, 'search_result_id': search_result_id, 'created_at': datetime.utcnow()})
+        return search_result_id
+
+    def _submit(self, job: dict):
+        writer = get_search_persistence_writer()
+        if writer is not None:
+            writer.enqueue(job)
+        else:
+            persist_search_batch([job])
+
+    def _compact_results(self, results: list) -> list:
+        """Resultados sin el perfil completo de cada candidato (solo IDs, archivo y scores)."""
+        return [{key: value for key, value in result.items() if key != 'profile'} for result in results]
+
+    def is_search_pending(self, search_id: int) -> bool:
+        """Indica si la búsqueda todavía está en la cola del escritor (su ID aún no existe en la BD)."""
+        writer = get_search_persistence_writer()
+        return writer is not None and writer.is_pending(search_id)
+
+    def get_search_result_detail(self, search_id: int) -> dict:
+        """
+        Obtiene una búsqueda del historial con sus resultados completos. Si se guardó en
+        modo 'ids', los resultados se toman de la copia comprimida o, si no la hay, se
+        hidratan con los perfiles actuales de los candidatos (una sola consulta).
+        """
+        result = self.get_search_result_by_id(search_id)
+        detail = result.to_dict()
+        if result.result_json is not None:
+            return detail
+
+        detail['result_json'] = result.snapshot_results()
+        if detail['result_json'] is None:
+            detail['result_json'] = self._hydrate_items(result.items)
+        return detail
+
+    def _hydrate_items(self, items: list) -> list:
+        candidates = self.document_repository.find_candidates_by_document_ids([item.document_id for item in items])
+        candidates_by_document = {candidate.document_id: candidate for candidate in candidates}
+
+        hydrated = []
+        for item in items:
+            candidate = candidates_by_document.get(item.document_id)
+            hydrated_item = {
+                'document_id': item.document_id,
+                'filename': candidate.document.filename if candidate else None,
+                'similarity_percentage': item.score,
+                **(item.details or {}),
+                'profile': candidate.to_dict() if candidate else None,
+            }
+            if candidate is None:
+                hydrated_item['deleted'] = True
+            hydrated.append(hydrated_item)
+        return hydrated
+
+    def get_search_history_page(self, limit: int = 20, cursor: str | None = None, query_text: str | None = None) -> dict:
+        """
+        Devuelve una página del historial (sin resultados) y el cursor de la siguiente página,
+        o None si no hay más. Lanza ValueError si el cursor es inválido.
+        """
+        limit = max(1, min(limit, 100))
+        rows = self.repository.find_page(limit + 1, self._decode_cursor(cursor) if cursor else None, query_text)
+        page = rows[:limit]
+        next_cursor = self._encode_cursor(page[-1].last_run_at, page[-1].id) if len(rows) > limit else None
+        return {
+            'items': [
+                {
+                    'id': row.id,
+                    'query': row.query,
+                    'saved_file': row.saved_file,
+                    'search_type': row.search_type,
+                    'hit_count': row.hit_count,
+                    'created_at': row.created_at.isoformat() if row.created_at else None,
+                    'last_run_at': row.last_run_at.isoformat() if row.last_run_at else None
+                }
+                for row in page
+            ],
+            'next_cursor': next_cursor
+        }
+
+    @staticmethod
+    def _encode_cursor(last_run_at: datetime, search_id: int) -> str:
+        return base64.urlsafe_b64encode(f"{last_run_at.isoformat()}|{search_id}".encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> tuple:
+        try:
+            last_run_at, search_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+            return datetime.fromisoformat(last_run_at), int(search_id)
+        except (ValueError, UnicodeDecodeError) as e:
+            raise ValueError("Cursor de paginación inválido") from e
+
     def get_all_search_results(self):
         """
         Obtiene el historial de búsquedas usando el método correcto del repositorio.
@@ -0,0 +1,316 @@
+# app/services/SearchPersistenceWriter.py
+
+import os
+import json
+import queue
+import atexit
+import threading
+from flask import current_app
+from sqlalchemy import null
+
+from app.extensions import db
+from app.models.Result import SearchResult
+from app.models.SearchResultItem import SearchResultItem
+from app.repositories.SearchResultRepository import SearchResultRepository
+
+
+def write_results_file(saved_file: str, payload: dict):
+    """Escribe el archivo JSON de resultados de una búsqueda en la carpeta de resultados."""
+    results_folder = current_app.config.get('RESULTADOS_FOLDER', 'resultados')
+    os.makedirs(results_folder, exist_ok=True)
+    filepath = os.path.join(results_folder, saved_file)
+    with open(filepath, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def remove_results_file(saved_file: str):
+    """Elimina un archivo de resultados, si existe."""
+    filepath = os.path.join(current_app.config.get('RESULTADOS_FOLDER', 'resultados'), saved_file)
+    if os.path.exists(filepath):
+        os.remove(filepath)
+
+
+def persist_search_batch(jobs: list[dict]) -> int:
+    """
+    Escribe los archivos de resultados y guarda los registros de historial de un lote
+    en una sola transacción. Las búsquedas repetidas actualizan su entrada existente
+    (hit_count, last_run_at y resultados) en lugar de crear otra, aunque se les haya
+    reservado un ID nuevo: la entrada se busca por consulta normalizada y modo, que son
+    únicos en la tabla. Si otro proceso inserta la misma consulta a la vez, la restricción
+    única hace fallar el lote y el reintento individual del escritor la agrupa.
+    Devuelve la cantidad de búsquedas guardadas.
+    """
+    for job in jobs:
+        if job.get('saved_file'):
+            try:
+                write_results_file(job['saved_file'], job['file_payload'])
+            except (IOError, OSError) as e:
+                current_app.logger.error(f"Error al guardar el archivo de resultados '{job['saved_file']}': {e}")
+                job['saved_file'] = None
+
+    repository = SearchResultRepository()
+    new_entities = {}
+    new_entities_by_query = {}
+    replaced_files = []
+    for job in jobs:
+        search_result_id = job['search_result_id']
+        existing = new_entities.get(search_result_id)
+        if existing is None and (job.get('existing') or job.get('touch')):
+            existing = repository.find_by_id(search_result_id)
+        if job.get('touch'):
+            if existing is None:
+                current_app.logger.warning(f"[ADVERTENCIA] La entrada {search_result_id} del historial ya no existe. Se ignora el hit en caché.")
+            else:
+                touch_search_result(existing, job)
+            continue
+        if existing is None:
+            query_key = (job.get('query_normalized'), job.get('search_type'))
+            existing = new_entities_by_query.get(query_key)
+            if existing is None and query_key[0] is not None:
+                existing = repository.find_by_normalized_query(*query_key)
+            if existing is not None:
+                current_app.logger.info(
+                    f"[INFO] La búsqueda {search_result_id} repite la consulta de la entrada {existing.id}. Se agrupa en ella."
+                )
+        if existing is None:
+            # Primera ejecución, o la entrada se eliminó mientras el trabajo estaba en cola
+            new_entities[search_result_id] = new_entities_by_query[query_key] = build_search_result(job)
+            continue
+        if existing.saved_file and existing.saved_file != job['saved_file']:
+            replaced_files.append(existing.saved_file)
+        apply_search_run(existing, job)
+
+    repository.create_many(list(new_entities.values()))
+
+    for saved_file in replaced_files:
+        try:
+            remove_results_file(saved_file)
+        except OSError as e:
+            current_app.logger.warning(f"[ADVERTENCIA] No se pudo eliminar el archivo de resultados anterior '{saved_file}': {e}")
+    return len(jobs)
+
+
+def build_search_result(job: dict) -> SearchResult:
+    """
+    Arma el registro de historial de la primera ejecución de una consulta.
+    """
+    search_result = SearchResult(
+        id=job['search_result_id'], query=job['query'], query_normalized=job.get('query_normalized'),
+        search_type=job.get('search_type'), hit_count=1, last_run_at=job['created_at'],
+        saved_file=job['saved_file'], created_at=job['created_at']
+    )
+    _set_results(search_result, job)
+    return search_result
+
+
+def touch_search_result(search_result: SearchResult, job: dict):
+    """Registra una ejecución resuelta desde la caché: suma un hit sin tocar los resultados."""
+    search_result.hit_count = (search_result.hit_count or 0) + 1
+    search_result.last_run_at = max(filter(None, [search_result.last_run_at, job['created_at']]))
+
+
+def apply_search_run(search_result: SearchResult, job: dict):
+    """
+    Registra una nueva ejecución de una consulta ya guardada: suma un hit y reemplaza
+    los resultados por los de la ejecución más reciente.
+    """
+    search_result.hit_count = (search_result.hit_count or 0) + 1
+    search_result.last_run_at = job['created_at']
+    search_result.query = job['query']
+    search_result.saved_file = job['saved_file']
+    search_result.result_json = null()
+    search_result.snapshot = None
+    search_result.items = []
+    _set_results(search_result, job)
+
+
+def _set_results(search_result: SearchResult, job: dict):
+    """
+    Guarda los resultados según el modo del trabajo: 'full' los guarda completos en
+    result_json; 'ids' guarda una fila por candidato (document_id, posición, score) y,
+    opcionalmente, una copia comprimida.
+    """
+    results = job['results']
+    if job['store_mode'] == 'full':
+        search_result.result_json = results
+        return
+
+    search_result.items = [
+        SearchResultItem(
+            document_id=result['document_id'], rank=rank, score=result['similarity_percentage'],
+            details={key: value for key, value in result.items() if key not in ('document_id', 'similarity_percentage', 'profile')} or None
+        )
+        for rank, result in enumerate(results, 1)
+    ]
+    if job['snapshot']:
+        search_result.snapshot = SearchResult.compress_results(results)
+
+
+class SearchPersistenceWriter:
+    """
+    Cola de escritura en segundo plano para el historial de búsquedas.
+    Un hilo daemon agrupa los trabajos (hasta `batch_size` o lo acumulado en
+    `flush_interval` segundos) y los persiste con persist_search_batch. Si la cola
+    está llena, el trabajo se persiste en el hilo que lo encola para no perderlo.
+    Mientras un trabajo no se guardó, su ID y su consulta quedan registrados como
+    pendientes: el detalle del historial responde 202 en lugar de 404 y las repeticiones
+    de la consulta reutilizan el mismo ID.
+    """
+
+    def __init__(self, app, batch_size: int, flush_interval: float, max_queue_size: int):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._pending_ids = {}
+        self._pending_queries = {}
+        self._pending_lock = threading.Lock()
+        self._counters = {'enqueued': 0, 'written': 0, 'batches': 0, 'batch_retries': 0, 'inline_writes': 0, 'errors': 0}
+        self._counters_lock = threading.Lock()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='search-persistence-writer', daemon=True)
+        self._thread.start()
+        self.app.logger.info(f"[INFO] Escritor de historial de búsquedas iniciado (lote: {self.batch_size}, intervalo: {self.flush_interval}s).")
+
+    def enqueue(self, job: dict):
+        self._track(job)
+        try:
+            self._queue.put_nowait(job)
+            self._count('enqueued')
+        except queue.Full:
+            current_app.logger.warning("[ADVERTENCIA] Cola de historial de búsquedas llena. Se guarda la búsqueda en línea.")
+            self._count('inline_writes')
+            self._write([job])
+
+    def flush(self):
+        """Persiste todo lo que quede en la cola (se usa al terminar el proceso)."""
+        while True:
+            batch = self._drain(block=False)
+            if not batch:
+                return
+            with self.app.app_context():
+                self._write(batch)
+
+    def is_pending(self, search_result_id: int) -> bool:
+        """Indica si el ID tiene una búsqueda en cola o escribiéndose."""
+        with self._pending_lock:
+            return search_result_id in self._pending_ids
+
+    def pending_id_for(self, query_normalized: str, search_type: str) -> int | None:
+        """ID de la búsqueda pendiente de guardar con la misma consulta normalizada y modo, si la hay."""
+        with self._pending_lock:
+            return self._pending_queries.get((query_normalized, search_type))
+
+    def _track(self, job: dict):
+        if job.get('touch'):
+            return
+        search_result_id = job['search_result_id']
+        with self._pending_lock:
+            self._pending_ids[search_result_id] = self._pending_ids.get(search_result_id, 0) + 1
+            self._pending_queries[(job.get('query_normalized'), job.get('search_type'))] = search_result_id
+
+    def _untrack(self, batch: list[dict]):
+        with self._pending_lock:
+            for job in batch:
+                if job.get('touch'):
+                    continue
+                search_result_id = job['search_result_id']
+                remaining = self._pending_ids.get(search_result_id, 0) - 1
+                if remaining > 0:
+                    self._pending_ids[search_result_id] = remaining
+                else:
+                    self._pending_ids.pop(search_result_id, None)
+                query_key = (job.get('query_normalized'), job.get('search_type'))
+                if self._pending_queries.get(query_key) == search_result_id and search_result_id not in self._pending_ids:
+                    del self._pending_queries[query_key]
+
+    def get_stats(self) -> dict:
+        with self._counters_lock:
+            return dict(self._counters, pending=self._queue.qsize())
+
+    def _run(self):
+        while True:
+            batch = self._drain(block=True)
+            if batch:
+                with self.app.app_context():
+                    self._write(batch)
+
+    def _drain(self, block: bool) -> list[dict]:
+        batch = []
+        try:
+            if block:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+            while len(batch) < self.batch_size:
+                batch.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _write(self, batch: list[dict]):
+        with self._flush_lock:
+            try:
+                self._write_batch(batch)
+            finally:
+                self._untrack(batch)
+
+    def _write_batch(self, batch: list[dict]):
+        try:
+            written = persist_search_batch(batch)
+            self._count('written', written)
+            self._count('batches')
+            return
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning(
+                f"[ADVERTENCIA] Falló el guardado de un lote de {len(batch)} búsquedas ({e}). Se reintenta de a una."
+            )
+
+        # Reintento individual: solo se pierde la búsqueda que provoca el error. Un choque con la
+        # restricción única (otro proceso guardó la misma consulta) se resuelve aquí, agrupando en esa entrada.
+        self._count('batch_retries')
+        for job in batch:
+            try:
+                self._count('written', persist_search_batch([job]))
+            except Exception as e:
+                db.session.rollback()
+                self._count('errors')
+                current_app.logger.error(
+                    f"[ERROR] Falló el guardado de la búsqueda {job['search_result_id']} en el historial. Causa: {e}"
+                )
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._counters_lock:
+            self._counters[counter] += amount
+
+
+_writer = None
+
+
+def init_search_persistence_writer(app):
+    """
+    Crea el escritor de historial y lanza su hilo, si SEARCH_PERSISTENCE_ASYNC está activo.
+    """
+    global _writer
+
+    if _writer is not None or not app.config.get('SEARCH_PERSISTENCE_ASYNC', True):
+        return _writer
+
+    _writer = SearchPersistenceWriter(
+        app,
+        batch_size=app.config['SEARCH_PERSISTENCE_BATCH_SIZE'],
+        flush_interval=app.config['SEARCH_PERSISTENCE_FLUSH_INTERVAL_SECONDS'],
+        max_queue_size=app.config['SEARCH_PERSISTENCE_QUEUE_SIZE'],
+    )
+    _writer.start()
+    atexit.register(_writer.flush)
+    return _writer
+
+
+def get_search_persistence_writer():
+    """Obtiene el escritor de historial inicializado, o None si se persiste en línea."""
+    return _writer
@@ -1,17 +1,18 @@
 # app/services/search_service.py
 
-import os
-import json
 import numpy as np
 from flask import current_app
-from datetime import datetime
 
 from app.services.OpenAIService import OpenAIRewriteService
 from app.services.SearchHistoryService import SearchHistoryService # Importa el servicio renombrado
-from app.extensions import get_faiss_index
-from app.models.Candidate import Candidate 
+from app.extensions import get_faiss_index, reconstruct_vectors
+from app.repositories.DocumentRepository import DocumentRepository
+from app.services.SearchCacheService import search_cache_key, get_cached_search, cache_search_result
+from app.timing import span
 
 class SearchService:
+    BATCH_SEARCH_TYPE = 'batch'  # Modo de caché e historial de perform_batch_search
+
     def __init__(self):
         self.openai_service = OpenAIRewriteService()
         self.history_service = SearchHistoryService()
@@ -20,43 +21,174 @@ class SearchService:
         """
         Orquesta todo el proceso de búsqueda: embedding, FAISS, consulta a BD y guardado.
         """
-        query_processed = self.openai_service.expandir_consulta_con_llm(query)
+        cache_key = search_cache_key(query, 'semantic', k)
+        cached_response = get_cached_search(cache_key)
+        if cached_response is not None:
+            # El hit también cuenta en el historial (hit_count y last_run_at de su entrada)
+            with span('history'):
+                search_result_id = self.history_service.record_cache_hit(query, cached_response, 'semantic')
+            return dict(cached_response, search_result_id=search_result_id)
+
+        with span('llm_expand'):
+            query_processed = self.openai_service.expandir_consulta_con_llm(query)
         current_app.logger.info(f"Consulta procesada: {query_processed}")
-        embedding = self.openai_service.generate_embedding(query_processed)
+        with span('embedding'):
+            embedding = self.openai_service.generate_embedding(query_processed)
         faiss_idx = get_faiss_index()
         if faiss_idx is None:
             raise Exception("Índice FAISS no disponible")
 
         query_vector = np.array([embedding], dtype=np.float32)
-        distances, indices = faiss_idx.search(query_vector, k)
+        with span('faiss'):
+            distances, indices = faiss_idx.search(query_vector, k)
 
-        results = self._process_faiss_results(distances, indices)
-        filename = self._save_results_to_file(query, results)
-        search_result_db = self.history_service.save_search_result(query, results, filename)
+        with span('candidates'):
+            results = self._process_faiss_results(distances, indices)
+        with span('history'):
+            search_result_id = self.history_service.record_search(query, results, 'semantic')
 
-        return {
+        response = {
             'results': results,
-            'search_result_id': search_result_db.id if search_result_db else None
+            'search_result_id': search_result_id
+        }
+        cache_search_result(cache_key, response)
+        return response
+
+    def perform_batch_search(self, queries: list[str], k: int = 10) -> dict:
+        """
+        Busca varias consultas a la vez: una sola llamada al LLM para expandirlas, una sola
+        llamada de embeddings, una búsqueda FAISS sobre la matriz apilada de vectores y una
+        sola consulta a BD para los candidatos de todas las consultas. Las consultas repetidas
+        en el lote (misma clave de caché) se resuelven y registran una sola vez, y las que ya
+        están en caché no pasan por ninguno de esos pasos.
+
+        La expansión por lotes usa otro prompt y modelo que la de perform_search, por lo que
+        sus resultados se cachean y registran aparte (modo 'batch'). Si la expansión falla, se
+        busca con las consultas originales y esos resultados no se cachean ni se registran.
+        """
+        # Posiciones del lote agrupadas por clave de caché, en orden de primera aparición
+        positions_by_key = {}
+        for position, query in enumerate(queries):
+            positions_by_key.setdefault(search_cache_key(query, self.BATCH_SEARCH_TYPE, k), []).append(position)
+
+        responses_by_key = {}
+        pending_keys = []
+        for cache_key, positions in positions_by_key.items():
+            cached_response = get_cached_search(cache_key)
+            if cached_response is not None:
+                with span('history'):
+                    search_result_id = self.history_service.record_cache_hit(queries[positions[0]], cached_response, self.BATCH_SEARCH_TYPE)
+                responses_by_key[cache_key] = dict(cached_response, search_result_id=search_result_id)
+            else:
+                pending_keys.append(cache_key)
+
+        if pending_keys:
+            faiss_idx = get_faiss_index()
+            if faiss_idx is None:
+                raise Exception("Índice FAISS no disponible")
+
+            pending_queries = [queries[positions_by_key[cache_key][0]] for cache_key in pending_keys]
+            with span('llm_expand'):
+                queries_processed = self.openai_service.expandir_consultas_con_llm(pending_queries)
+            expanded = queries_processed is not None
+            if not expanded:
+                current_app.logger.warning("[ADVERTENCIA] Búsqueda por lotes sin expansión: los resultados no se cachean ni se registran.")
+                queries_processed = pending_queries
+            with span('embedding'):
+                embeddings = self.openai_service.generate_embeddings(queries_processed)
+
+            query_vectors = np.array(embeddings, dtype=np.float32)
+            with span('faiss'):
+                distances, indices = faiss_idx.search(query_vectors, k)
+
+            with span('candidates'):
+                candidates_by_id = self._load_candidates(indices)
+
+            for row, (cache_key, query) in enumerate(zip(pending_keys, pending_queries)):
+                results = self._build_results(distances[row], indices[row], candidates_by_id)
+                if not expanded:
+                    responses_by_key[cache_key] = {'results': results, 'search_result_id': None, 'expanded': False}
+                    continue
+                with span('history'):
+                    search_result_id = self.history_service.record_search(query, results, self.BATCH_SEARCH_TYPE)
+                response = {
+                    'results': results,
+                    'search_result_id': search_result_id
+                }
+                cache_search_result(cache_key, response)
+                responses_by_key[cache_key] = response
+
+        current_app.logger.info(
+            f"Búsqueda por lotes: {len(queries)} consultas, {len(positions_by_key)} distintas, {len(pending_keys)} resueltas sin caché."
+        )
+        responses = [None] * len(queries)
+        for cache_key, positions in positions_by_key.items():
+            for position in positions:
+                responses[position] = responses_by_key[cache_key]
+        return {
+            'searches': [dict(response, query=query) for query, response in zip(queries, responses)]
+        }
+
+    def find_similar_candidates(self, document_id: int, k: int = 10) -> dict:
+        """
+        Busca los candidatos más parecidos a uno existente usando su vector guardado en FAISS
+        como consulta, sin expansión con LLM ni llamada de embeddings.
+        """
+        cache_key = search_cache_key(f"similar {document_id}", 'similar', k)
+        cached_response = get_cached_search(cache_key)
+        if cached_response is not None:
+            return cached_response
+
+        faiss_idx = get_faiss_index()
+        if faiss_idx is None:
+            raise Exception("Índice FAISS no disponible")
+
+        with span('reconstruct'):
+            vector = reconstruct_vectors([document_id]).get(document_id)
+        if vector is None:
+            raise ValueError(f"El documento {document_id} no tiene un embedding en el índice")
+
+        # Se pide un vecino extra porque el propio documento es el primero
+        with span('faiss'):
+            distances, indices = faiss_idx.search(vector.reshape(1, -1), k + 1)
+        keep = indices[0] != document_id
+        distances, indices = distances[:, keep], indices[:, keep]
+
+        with span('candidates'):
+            results = self._process_faiss_results(distances, indices)[:k]
+
+        response = {
+            'document_id': document_id,
+            'results': results
         }
+        cache_search_result(cache_key, response)
+        return response
 
     def _process_faiss_results(self, distances, indices) -> list:
         """
         Procesa los resultados de FAISS y obtiene los perfiles de la base de datos.
         """
+        return self._build_results(distances[0], indices[0], self._load_candidates(indices))
+
+    @staticmethod
+    def _load_candidates(indices) -> dict:
+        """Carga en una sola consulta los candidatos de todos los IDs devueltos por FAISS."""
+        document_ids = list({int(document_id) for document_id in np.asarray(indices).ravel() if document_id != -1})
+        return {candidate.document_id: candidate for candidate in DocumentRepository().find_candidates_by_document_ids(document_ids)}
+
+    @staticmethod
+    def _build_results(distances_row, indices_row, candidates_by_id: dict) -> list:
         processed_results = []
-        for i in range(len(indices[0])):
-            if indices[0][i] == -1: break
-            
-            document_id = int(indices[0][i])
-            candidate = Candidate.query.filter_by(document_id=document_id).first()
+        for distance, document_id in zip(distances_row, indices_row):
+            if document_id == -1: break
 
+            candidate = candidates_by_id.get(int(document_id))
             if not candidate:
-                current_app.logger.warning(f"Doc {document_id} en FAISS sin perfil de candidato. Se omite.")
+                current_app.logger.warning(f"Doc {int(document_id)} en FAISS sin perfil de candidato. Se omite.")
                 continue
 
-            distance = distances[0][i].item()
-            similarity_percentage = round((1 / (1 + distance)) * 100, 2)
-            
+            similarity_percentage = round((1 / (1 + float(distance))) * 100, 2)
+
             processed_results.append({
                 'document_id': candidate.document_id,
                 'filename': candidate.document.filename,
@@ -64,25 +196,3 @@ class SearchService:
                 'profile': candidate.to_dict()
             })
         return processed_results
-
-    def _save_results_to_file(self, query: str, results: list) -> str:
-        """
-        Guarda los resultados de la búsqueda en un archivo JSON.
-        """
-        try:
-            resultados_folder = 'resultados'
-            os.makedirs(resultados_folder, exist_ok=True)
-            timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-            filename = f'resultados_{timestamp}.json'
-            filepath = os.path.join(resultados_folder, filename)
-            
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump({'query': query, 'results': results}, f, indent=4, ensure_ascii=False)
-            
-            current_app.logger.info(f"Resultados guardados en {filepath}")
-            return filename
-        except Exception as e:
-            current_app.logger.error(f"Error al guardar resultados en archivo: {e}")
-            return None
-        
-    
\ No newline at end of file
@@ -0,0 +1,121 @@
+# app/services/SemanticQueryCache.py
+"""
+Caché de consultas casi duplicadas para la búsqueda híbrida.
+
+Guarda el embedding de la consulta original (sin expandir) junto con la respuesta final
+en un índice FAISS pequeño de producto interno sobre vectores normalizados, es decir,
+similitud coseno. Si una consulta nueva supera el umbral de similitud con una reciente
+del mismo modo, k y versión de índice, se devuelve la respuesta guardada sin llamar a
+la expansión con LLM ni a la extracción de keywords.
+"""
+
+import time
+import threading
+import faiss
+import numpy as np
+from flask import current_app
+
+
+class SemanticQueryCache:
+    NEIGHBORS_TO_CHECK = 5
+
+    def __init__(self, dimension: int, max_entries: int, threshold: float):
+        self.dimension = dimension
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._index = faiss.IndexIDMap(faiss.IndexFlatIP(dimension))
+        self._entries = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, query_vector, mode: str, k: int, index_version: int) -> tuple[dict, float, str] | None:
+        """
+        Busca una consulta reciente equivalente. Devuelve (respuesta, similitud, consulta original) o None.
+        """
+        vector = self._normalize(query_vector)
+        now = time.monotonic()
+        with self._lock:
+            if self._index.ntotal == 0:
+                self.misses += 1
+                return None
+            similarities, entry_ids = self._index.search(vector, min(self.NEIGHBORS_TO_CHECK, self._index.ntotal))
+            for similarity, entry_id in zip(similarities[0], entry_ids[0]):
+                if entry_id == -1 or similarity < self.threshold:
+                    break
+                entry = self._entries.get(int(entry_id))
+                if entry is None or entry['expires_at'] <= now or entry['index_version'] != index_version:
+                    continue
+                if entry['mode'] == mode and entry['k'] == k:
+                    self.hits += 1
+                    return entry['response'], float(similarity), entry['query']
+            self.misses += 1
+            return None
+
+    def add(self, query_vector, query: str, mode: str, k: int, index_version: int, response: dict, ttl: float):
+        vector = self._normalize(query_vector)
+        now = time.monotonic()
+        with self._lock:
+            # Las entradas vencidas o de otra versión del índice ya no pueden devolverse
+            stale_ids = [
+                entry_id for entry_id, entry in self._entries.items()
+                if entry['expires_at'] <= now or entry['index_version'] != index_version
+            ]
+            # Si sigue lleno, se desaloja la entrada más antigua
+            overflow = len(self._entries) - len(stale_ids) - self.max_entries + 1
+            if overflow > 0:
+                stale_ids.extend(sorted(set(self._entries) - set(stale_ids))[:overflow])
+            self._remove_unlocked(stale_ids)
+
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = {
+                'query': query, 'mode': mode, 'k': k, 'index_version': index_version,
+                'response': response, 'expires_at': now + ttl,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._index.reset()
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses, 'threshold': self.threshold}
+
+    def _remove_unlocked(self, entry_ids: list[int]):
+        if not entry_ids:
+            return
+        self._index.remove_ids(np.array(entry_ids, dtype=np.int64))
+        for entry_id in entry_ids:
+            self._entries.pop(entry_id, None)
+
+    def _normalize(self, query_vector) -> np.ndarray:
+        vector = np.array(query_vector, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(vector)
+        return vector
+
+
+_semantic_query_cache = None
+_semantic_query_cache_lock = threading.Lock()
+
+
+def get_semantic_query_cache() -> SemanticQueryCache | None:
+    """
+    Devuelve la caché semántica, creándola en el primer uso.
+    Devuelve None si SEMANTIC_CACHE_ENABLED está desactivado.
+    """
+    global _semantic_query_cache
+    if not current_app.config.get('SEMANTIC_CACHE_ENABLED', False):
+        return None
+    if _semantic_query_cache is None:
+        with _semantic_query_cache_lock:
+            if _semantic_query_cache is None:
+                _semantic_query_cache = SemanticQueryCache(
+                    dimension=current_app.config['FAISS_EMBEDDING_DIMENSION'],
+                    max_entries=current_app.config['SEMANTIC_CACHE_MAX_ENTRIES'],
+                    threshold=current_app.config['SEMANTIC_CACHE_THRESHOLD'],
+                )
+    return _semantic_query_cache
@@ -0,0 +1,140 @@
+# app/services/StorageService.py
+"""
+Backends de almacenamiento de archivos intercambiables por configuración.
+
+STORAGE_BACKEND='s3' (por defecto) usa el bucket de AWS; STORAGE_BACKEND='local' guarda
+los archivos en disco bajo LOCAL_STORAGE_ROOT, lo que permite ejecutar y perfilar el
+pipeline completo sin red ni credenciales de AWS.
+"""
+
+import os
+import shutil
+import uuid
+from datetime import datetime, timedelta, timezone
+from abc import ABC, abstractmethod
+from flask import current_app, url_for
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+
+from app.services.AwsService import AWSService
+
+
+class StorageBackend(ABC):
+    @abstractmethod
+    def put(self, local_path: str, filename: str) -> tuple[str | None, str | None]:
+        """Guarda un archivo local. Devuelve (URL de referencia, clave) o (None, None) si falla."""
+        pass
+
+    @abstractmethod
+    def stream(self, key: str, chunk_size: int = 64 * 1024):
+        """Genera el contenido del archivo en bloques."""
+        pass
+
+    @abstractmethod
+    def delete_many(self, keys: list[str]) -> list[str]:
+        """Elimina varios archivos. Devuelve las claves que no pudieron eliminarse."""
+        pass
+
+    @abstractmethod
+    def signed_url(self, key: str, expires_in: int | None = None) -> tuple[str | None, int]:
+        """
+        Devuelve (URL de descarga de corta duración, segundos de validez que le quedan).
+        Una URL reutilizada de la caché puede tener menos validez que `expires_in`.
+        """
+        pass
+
+    def url(self, key: str, expires_in: int | None = None) -> str | None:
+        """Devuelve una URL de descarga de corta duración."""
+        return self.signed_url(key, expires_in)[0]
+
+
+class S3StorageBackend(StorageBackend):
+    def __init__(self):
+        self.aws_service = AWSService()
+
+    def put(self, local_path, filename):
+        return self.aws_service.subir_pdf(local_path, filename)
+
+    def stream(self, key, chunk_size=64 * 1024):
+        response = self.aws_service.s3.meta.client.get_object(Bucket=self.aws_service.bucket_name, Key=key)
+        yield from response['Body'].iter_chunks(chunk_size)
+
+    def delete_many(self, keys):
+        return self.aws_service.borrar_archivos_lote(keys)
+
+    def signed_url(self, key, expires_in=None):
+        return self.aws_service.generar_url_firmada_con_vencimiento(key, expires_in)
+
+
+class LocalStorageBackend(StorageBackend):
+    TOKEN_SALT = 'local-storage-download'
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def put(self, local_path, filename):
+        key = f"curriculums/{uuid.uuid4().hex}/{filename}"
+        try:
+            target_path = self._path_for(key)
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            shutil.copyfile(local_path, target_path)
+            current_app.logger.info(f"✅ Archivo guardado en almacenamiento local: {target_path}")
+            return None, key
+        except Exception as e:
+            current_app.logger.error(f"❌ Error al guardar '{filename}' en almacenamiento local: {str(e)}")
+            return None, None
+
+    def stream(self, key, chunk_size=64 * 1024):
+        with open(self._path_for(key), 'rb') as file:
+            while chunk := file.read(chunk_size):
+                yield chunk
+
+    def delete_many(self, keys):
+        failed_keys = []
+        for key in keys:
+            try:
+                os.remove(self._path_for(key))
+                try:
+                    os.rmdir(os.path.dirname(self._path_for(key)))
+                except OSError:
+                    pass
+            except FileNotFoundError:
+                current_app.logger.warning(f"⚠️ Archivo no encontrado en almacenamiento local: {key}")
+            except Exception as e:
+                current_app.logger.error(f"❌ Error al eliminar '{key}' del almacenamiento local: {str(e)}")
+                failed_keys.append(key)
+        return failed_keys
+
+    def signed_url(self, key, expires_in=None):
+        expires_in = expires_in or current_app.config.get('PRESIGNED_URL_EXPIRATION', 900)
+        token = self._serializer().dumps({'key': key, 'exp': expires_in})
+        return url_for('document.download_local_file', token=token, _external=True), expires_in
+
+    def resolve_token(self, token: str) -> str | None:
+        """Valida un token generado por url() y devuelve la clave, o None si es inválido o expiró."""
+        try:
+            data, signed_at = self._serializer().loads(token, return_timestamp=True)
+            if datetime.now(timezone.utc) - signed_at > timedelta(seconds=data['exp']):
+                return None
+            return data['key']
+        except (BadSignature, KeyError, TypeError):
+            return None
+
+    def _serializer(self):
+        return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=self.TOKEN_SALT)
+
+    def _path_for(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if os.path.commonpath([self.root, path]) != self.root:
+            raise ValueError(f"Clave de almacenamiento fuera del directorio raíz: {key}")
+        return path
+
+
+def create_storage_backend() -> StorageBackend:
+    """Crea el backend de almacenamiento configurado en STORAGE_BACKEND."""
+    backend = current_app.config.get('STORAGE_BACKEND', 's3').lower()
+    if backend == 'local':
+        return LocalStorageBackend(current_app.config['LOCAL_STORAGE_ROOT'])
+    if backend == 's3':
+        return S3StorageBackend()
+    raise ValueError(f"STORAGE_BACKEND desconocido: '{backend}'. Valores válidos: 's3', 'local'.")
@@ -0,0 +1,138 @@
+# app/services/TempUploadSweeper.py
+
+import os
+import time
+import threading
+from datetime import datetime
+from flask import current_app
+
+from app.background import PeriodicTask
+from app.services.DocumentService import DocumentService, UPLOAD_FOLDER
+
+
+class TempUploadSweeper:
+    """
+    Mantiene acotado el directorio de subidas temporales: elimina los archivos que superan
+    el TTL y, si el total sigue por encima del límite de bytes, desaloja los más antiguos.
+    Los archivos más nuevos que `min_age` nunca se desalojan por tamaño, para no borrar
+    subidas que todavía se están procesando.
+    """
+
+    def __init__(self, upload_folder: str, ttl_seconds: int, max_bytes: int, min_age_seconds: int):
+        self.upload_folder = upload_folder
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.min_age_seconds = min_age_seconds
+        self._lock = threading.Lock()
+        self._counters = {
+            'sweeps': 0,
+            'expired_files': 0,
+            'evicted_files': 0,
+            'bytes_freed': 0,
+            'errors': 0,
+            'current_files': 0,
+            'current_bytes': 0,
+            'last_sweep_at': None,
+            'last_sweep_duration_ms': None,
+        }
+
+    def sweep(self) -> dict:
+        started = time.monotonic()
+        now = time.time()
+        entries = self._scan()
+
+        expired = [entry for entry in entries if now - entry['mtime'] > self.ttl_seconds]
+        remaining = sorted((entry for entry in entries if now - entry['mtime'] <= self.ttl_seconds), key=lambda entry: entry['mtime'])
+
+        expired_files = evicted_files = bytes_freed = errors = 0
+        for entry in expired:
+            if DocumentService.cleanup_temp_file(entry['name']):
+                expired_files += 1
+                bytes_freed += entry['size']
+            else:
+                errors += 1
+
+        total_bytes = sum(entry['size'] for entry in remaining)
+        current_files = len(remaining)
+        for entry in remaining:
+            if total_bytes <= self.max_bytes or now - entry['mtime'] < self.min_age_seconds:
+                break
+            if DocumentService.cleanup_temp_file(entry['name']):
+                evicted_files += 1
+                bytes_freed += entry['size']
+                total_bytes -= entry['size']
+                current_files -= 1
+            else:
+                errors += 1
+
+        with self._lock:
+            self._counters['sweeps'] += 1
+            self._counters['expired_files'] += expired_files
+            self._counters['evicted_files'] += evicted_files
+            self._counters['bytes_freed'] += bytes_freed
+            self._counters['errors'] += errors
+            self._counters['current_files'] = current_files
+            self._counters['current_bytes'] = total_bytes
+            self._counters['last_sweep_at'] = datetime.utcnow().isoformat()
+            self._counters['last_sweep_duration_ms'] = round((time.monotonic() - started) * 1000, 2)
+
+        if expired_files or evicted_files:
+            current_app.logger.info(
+                f"[INFO] Limpieza de '{self.upload_folder}': {expired_files} expirados, {evicted_files} desalojados por tamaño, "
+                f"{bytes_freed} bytes liberados. Quedan {current_files} archivos ({total_bytes} bytes)."
+            )
+        return self.get_stats()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counters)
+        stats.update({
+            'ttl_seconds': self.ttl_seconds,
+            'max_bytes': self.max_bytes,
+        })
+        return stats
+
+    def _scan(self) -> list[dict]:
+        entries = []
+        try:
+            with os.scandir(self.upload_folder) as iterator:
+                for entry in iterator:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    try:
+                        stat = entry.stat(follow_symlinks=False)
+                    except FileNotFoundError:
+                        continue
+                    entries.append({'name': entry.name, 'mtime': stat.st_mtime, 'size': stat.st_size})
+        except FileNotFoundError:
+            pass
+        return entries
+
+
+_sweeper = None
+_sweeper_task = None
+
+
+def init_temp_upload_sweeper(app):
+    """
+    Crea el barredor de subidas temporales y lanza su tarea periódica.
+    """
+    global _sweeper, _sweeper_task
+
+    if _sweeper is not None:
+        return _sweeper
+
+    _sweeper = TempUploadSweeper(
+        upload_folder=UPLOAD_FOLDER,
+        ttl_seconds=app.config['TEMP_UPLOAD_TTL_SECONDS'],
+        max_bytes=app.config['TEMP_UPLOAD_MAX_BYTES'],
+        min_age_seconds=app.config['TEMP_UPLOAD_MIN_AGE_SECONDS'],
+    )
+    _sweeper_task = PeriodicTask(app, 'temp-upload-sweeper', app.config['TEMP_UPLOAD_SWEEP_INTERVAL_SECONDS'], _sweeper.sweep)
+    _sweeper_task.start()
+    return _sweeper
+
+
+def get_temp_upload_sweeper():
+    """Obtiene el barredor de subidas temporales inicializado."""
+    return _sweeper
@@ -0,0 +1,112 @@
+"""
+Medición de latencia por etapa de las peticiones.
+
+`span(nombre)` mide un bloque de código: la duración se acumula en la petición actual
+(flask.g) para el header Server-Timing y en un histograma global por etapa, que se
+consulta con get_latency_stats().
+"""
+
+import re
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from flask import g, has_request_context
+
+# Límites superiores (ms) de los buckets de los histogramas; el último bucket es +inf
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_INVALID_METRIC_CHARS = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+class LatencyHistogram:
+    """Histograma de latencias con buckets fijos, seguro para uso concurrente."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+        self._max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, duration_ms: float):
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, duration_ms)] += 1
+            self._count += 1
+            self._sum += duration_ms
+            self._max = max(self._max, duration_ms)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts, count, total, maximum = list(self._counts), self._count, self._sum, self._max
+        return {
+            'count': count,
+            'avg_ms': round(total / count, 2) if count else None,
+            'max_ms': round(maximum, 2),
+            'p50_ms': self._percentile(counts, count, 0.50),
+            'p95_ms': self._percentile(counts, count, 0.95),
+            'p99_ms': self._percentile(counts, count, 0.99),
+            'buckets': {
+                f"le_{bound}" if bound is not None else 'le_inf': bucket_count
+                for bound, bucket_count in zip(list(self.buckets) + [None], counts)
+            },
+        }
+
+    def _percentile(self, counts: list[int], count: int, quantile: float):
+        """Límite superior del bucket que contiene el percentil (None si cae en +inf o no hay datos)."""
+        if not count:
+            return None
+        target = quantile * count
+        accumulated = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            accumulated += bucket_count
+            if accumulated >= target:
+                return bound
+        return None
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def record_timing(name: str, duration_ms: float):
+    """Registra una duración en el histograma de la etapa y en la petición actual."""
+    histogram = _histograms.get(name)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(name, LatencyHistogram())
+    histogram.observe(duration_ms)
+
+    if has_request_context():
+        timings = g.setdefault('server_timings', {})
+        timings[name] = timings.get(name, 0.0) + duration_ms
+
+
+@contextmanager
+def span(name: str):
+    """
+    Mide la duración del bloque como la etapa `name` (por ejemplo 'faiss' o 'llm_expand').
+    Si el bloque se ejecuta varias veces en la misma petición, las duraciones se suman.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, (time.perf_counter() - started) * 1000)
+
+
+def server_timing_header() -> str | None:
+    """Valor del header Server-Timing con las etapas medidas en la petición actual."""
+    timings = g.get('server_timings')
+    if not timings:
+        return None
+    return ', '.join(
+        f"{_INVALID_METRIC_CHARS.sub('_', name)};dur={duration_ms:.1f}" for name, duration_ms in timings.items()
+    )
+
+
+def get_latency_stats() -> dict:
+    with _histograms_lock:
+        histograms = dict(_histograms)
+    return {name: histogram.snapshot() for name, histogram in sorted(histograms.items())}
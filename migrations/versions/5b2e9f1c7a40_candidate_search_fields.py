@@ -0,0 +1,55 @@
+"""candidate search_text and search_tokens
+
+Revision ID: 5b2e9f1c7a40
+Revises: 38371457eeb7
+Create Date: 2026-10-18 22:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b2e9f1c7a40'
+down_revision = '38371457eeb7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('candidates', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('search_text', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('search_tokens', sa.JSON(), nullable=True))
+
+    # Rellenar los campos de los candidatos existentes
+    from app.services.LexicalIndexService import candidate_search_fields
+
+    connection = op.get_bind()
+    candidates = sa.table(
+        'candidates',
+        sa.column('id', sa.Integer), sa.column('nombre_completo', sa.String), sa.column('puesto_actual', sa.String),
+        sa.column('habilidad_principal', sa.String), sa.column('descripcion_profesional', sa.Text),
+        sa.column('candidato_ideal', sa.Text), sa.column('habilidades_clave', sa.JSON),
+        sa.column('experiencia_profesional', sa.JSON), sa.column('educacion', sa.JSON),
+        sa.column('search_text', sa.Text), sa.column('search_tokens', sa.JSON),
+    )
+    for row in connection.execute(sa.select(candidates)).mappings().all():
+        search_text, search_tokens = candidate_search_fields({
+            'Nombre completo': row['nombre_completo'],
+            'Puesto actual': row['puesto_actual'],
+            'Habilidad principal': row['habilidad_principal'],
+            'Descripción profesional': row['descripcion_profesional'],
+            'Candidato ideal': row['candidato_ideal'],
+            'Habilidades clave': row['habilidades_clave'],
+            'Experiencia Profesional': row['experiencia_profesional'],
+            'Educación': row['educacion'],
+        })
+        connection.execute(
+            candidates.update().where(candidates.c.id == row['id']).values(search_text=search_text, search_tokens=search_tokens)
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('candidates', schema=None) as batch_op:
+        batch_op.drop_column('search_tokens')
+        batch_op.drop_column('search_text')
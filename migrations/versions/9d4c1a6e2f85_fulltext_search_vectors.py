@@ -0,0 +1,41 @@
+"""full-text search_vector columns with GIN indexes
+
+Revision ID: 9d4c1a6e2f85
+Revises: 5b2e9f1c7a40
+Create Date: 2026-10-18 23:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4c1a6e2f85'
+down_revision = '5b2e9f1c7a40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('candidates', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(
+        "to_tsvector('spanish'::regconfig, coalesce(search_text, '')) || "
+        "to_tsvector('english'::regconfig, coalesce(search_text, ''))",
+        persisted=True
+    ), nullable=True))
+    op.create_index('ix_candidates_search_vector', 'candidates', ['search_vector'], unique=False, postgresql_using='gin')
+
+    op.add_column('search_results', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(
+        "to_tsvector('spanish'::regconfig, coalesce(query, '')) || "
+        "to_tsvector('english'::regconfig, coalesce(query, ''))",
+        persisted=True
+    ), nullable=True))
+    op.create_index('ix_search_results_search_vector', 'search_results', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_search_results_search_vector', table_name='search_results', postgresql_using='gin')
+    op.drop_column('search_results', 'search_vector')
+
+    op.drop_index('ix_candidates_search_vector', table_name='candidates', postgresql_using='gin')
+    op.drop_column('candidates', 'search_vector')
@@ -0,0 +1,48 @@
+"""normalized search history items and compressed snapshots
+
+Revision ID: c7a3e5d18b92
+Revises: 9d4c1a6e2f85
+Create Date: 2026-10-18 23:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7a3e5d18b92'
+down_revision = '9d4c1a6e2f85'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('search_result_items',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('search_result_id', sa.Integer(), nullable=False),
+    sa.Column('document_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('details', sa.JSON(), nullable=True),
+    sa.ForeignKeyConstraint(['search_result_id'], ['search_results.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('search_result_items', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_search_result_items_search_result_id'), ['search_result_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_search_result_items_document_id'), ['document_id'], unique=False)
+
+    with op.batch_alter_table('search_results', schema=None) as batch_op:
+        batch_op.alter_column('result_json', existing_type=sa.JSON(), nullable=True)
+        batch_op.add_column(sa.Column('snapshot', sa.LargeBinary(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('search_results', schema=None) as batch_op:
+        batch_op.drop_column('snapshot')
+        batch_op.alter_column('result_json', existing_type=sa.JSON(), nullable=False)
+
+    with op.batch_alter_table('search_result_items', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_search_result_items_document_id'))
+        batch_op.drop_index(batch_op.f('ix_search_result_items_search_result_id'))
+
+    op.drop_table('search_result_items')
@@ -0,0 +1,24 @@
+"""index for keyset pagination of search history
+
+Revision ID: e2b8f4a9c613
+Revises: c7a3e5d18b92
+Create Date: 2026-10-18 23:55:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b8f4a9c613'
+down_revision = 'c7a3e5d18b92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_search_results_created_at_id', 'search_results', [sa.text('created_at DESC'), sa.text('id DESC')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_search_results_created_at_id', table_name='search_results')
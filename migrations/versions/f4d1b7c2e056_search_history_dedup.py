@@ -0,0 +1,83 @@
+"""search history deduplication: normalized query, hit count and last run
+
+Revision ID: f4d1b7c2e056
+Revises: e2b8f4a9c613
+Create Date: 2026-10-19 00:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4d1b7c2e056'
+down_revision = 'e2b8f4a9c613'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('search_results', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('query_normalized', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('search_type', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('hit_count', sa.Integer(), nullable=False, server_default='1'))
+        batch_op.add_column(sa.Column('last_run_at', sa.DateTime(), nullable=True))
+
+    # Rellenar las entradas existentes en una sola sentencia. La normalización replica
+    # normalize_query (minúsculas, sin tildes, espacios colapsados) para los caracteres
+    # acentuados del español; el modo se toma del prefijo del archivo (resultados_hybrid_...).
+    op.execute("""
+        UPDATE search_results SET
+            last_run_at = created_at,
+            query_normalized = translate(
+                lower(regexp_replace(btrim(query), '\\s+', ' ', 'g')),
+                'áéíóúàèìòùäëïöüâêîôûãõñç', 'aeiouaeiouaeiouaeiouaonc'
+            ),
+            search_type = CASE WHEN saved_file LIKE 'resultados\\_hybrid\\_%' THEN 'hybrid' ELSE 'semantic' END
+    """)
+
+    # Unir las entradas repetidas: se conserva la ejecutada más recientemente, con la suma
+    # de hits y la fecha de la primera ejecución; el resto se elimina (sus items caen por
+    # ON DELETE CASCADE y sus archivos los limpia la retención como huérfanos).
+    op.execute("""
+        WITH grouped AS (
+            SELECT id,
+                   row_number() OVER w AS position,
+                   sum(hit_count) OVER (PARTITION BY query_normalized, search_type) AS total_hits,
+                   min(created_at) OVER (PARTITION BY query_normalized, search_type) AS first_created_at
+            FROM search_results
+            WHERE query_normalized IS NOT NULL
+            WINDOW w AS (PARTITION BY query_normalized, search_type ORDER BY last_run_at DESC, id DESC)
+        )
+        UPDATE search_results SET hit_count = grouped.total_hits, created_at = grouped.first_created_at
+        FROM grouped
+        WHERE search_results.id = grouped.id AND grouped.position = 1 AND grouped.total_hits > 1
+    """)
+    op.execute("""
+        DELETE FROM search_results
+        USING (
+            SELECT id, row_number() OVER (
+                PARTITION BY query_normalized, search_type ORDER BY last_run_at DESC, id DESC
+            ) AS position
+            FROM search_results
+            WHERE query_normalized IS NOT NULL
+        ) AS grouped
+        WHERE search_results.id = grouped.id AND grouped.position > 1
+    """)
+
+    op.drop_index('ix_search_results_created_at_id', table_name='search_results')
+    op.create_index('ix_search_results_last_run_at_id', 'search_results', [sa.text('last_run_at DESC'), sa.text('id DESC')], unique=False)
+    # Única: las escrituras concurrentes de una misma consulta no pueden crear dos entradas
+    op.create_index('ix_search_results_query_normalized_type', 'search_results', ['query_normalized', 'search_type'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_search_results_query_normalized_type', table_name='search_results')
+    op.drop_index('ix_search_results_last_run_at_id', table_name='search_results')
+    op.create_index('ix_search_results_created_at_id', 'search_results', [sa.text('created_at DESC'), sa.text('id DESC')], unique=False)
+
+    with op.batch_alter_table('search_results', schema=None) as batch_op:
+        batch_op.drop_column('last_run_at')
+        batch_op.drop_column('hit_count')
+        batch_op.drop_column('search_type')
+        batch_op.drop_column('query_normalized')